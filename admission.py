@@ -0,0 +1,141 @@
+"""
+Admission control for /api/chat: a bounded number of requests run at once,
+a short bounded queue waits for a slot, and everything beyond that is
+rejected immediately with a Retry-After hint
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+import time
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class SessionRateLimiter:
+    """
+    Token bucket per session (`rate_per_minute` requests, bursts up to
+    `burst`). Buckets are kept in an LRU map capped at `max_sessions`.
+    """
+
+    def __init__(self, rate_per_minute, burst, max_sessions=10000):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_sessions = max_sessions
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, session_id):
+        """Returns 0 when allowed, otherwise seconds until the next token"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(session_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate_per_second)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate_per_second
+            self._buckets[session_id] = (tokens, now)
+            while len(self._buckets) > self.max_sessions:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight=8, max_queue=16, queue_timeout=2.0,
+                 retry_after=2, rate_limiter=None):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.rate_limiter = rate_limiter
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.rate_limited = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def check_rate(self, session_id):
+        """Apply the per-session rate limit; raises AdmissionRejected (429)"""
+        if self.rate_limiter is None or not session_id:
+            return
+        wait = self.rate_limiter.allow(session_id)
+        if wait:
+            with self._cond:
+                self.rate_limited += 1
+            raise AdmissionRejected(
+                "Too many requests from this session", 429, max(1, round(wait))
+            )
+
+    @contextmanager
+    def slot(self, session_id=None):
+        """
+        Hold one in-flight slot for the duration of the block. Raises
+        AdmissionRejected (429 for rate limits when `session_id` is given,
+        503 for overload).
+        """
+        self.check_rate(session_id)
+        self._acquire()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify()
+
+    def _acquire(self):
+        start = time.monotonic()
+        with self._cond:
+            if self.in_flight >= self.max_in_flight:
+                if self.queued >= self.max_queue:
+                    self.rejected_queue_full += 1
+                    raise AdmissionRejected(
+                        "Server is busy, please retry shortly", 503, self.retry_after
+                    )
+                self.queued += 1
+                deadline = start + self.queue_timeout
+                try:
+                    while self.in_flight >= self.max_in_flight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.rejected_timeout += 1
+                            raise AdmissionRejected(
+                                "Server is busy, please retry shortly", 503, self.retry_after
+                            )
+                        self._cond.wait(remaining)
+                finally:
+                    self.queued -= 1
+
+            self.in_flight += 1
+            self.admitted += 1
+            waited = time.monotonic() - start
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'in_flight': self.in_flight,
+                'queued': self.queued,
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'rejected_queue_full': self.rejected_queue_full,
+                'rejected_timeout': self.rejected_timeout,
+                'rate_limited': self.rate_limited,
+                'avg_queue_wait_ms': (
+                    self.total_wait_seconds / self.admitted * 1000
+                    if self.admitted else 0.0
+                ),
+                'max_queue_wait_ms': self.max_wait_seconds * 1000
+            }
@@ -5,10 +5,36 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
 import numpy as np
+import openai
 from openai import OpenAI
 from supabase import create_client
+from supabase.lib.client_options import ClientOptions
+from postgrest.exceptions import APIError as PostgrestAPIError
+import httpx
 from dotenv import load_dotenv
 import json
+from corpus_index import (
+    CorpusIndex,
+    METADATA_FIELDS,
+    build_chunk_metadata,
+    list_storage_bytes,
+    route_partitions
+)
+from session_store import SessionStore, is_follow_up
+from single_flight import SingleFlight
+from intent_router import IntentRouter
+from model_cascade import CascadePolicy, CascadeStats
+from prompt_builder import PromptBuilder
+from admission import AdmissionController, AdmissionRejected, SessionRateLimiter
+from resilience import CircuitBreaker, Deadline, DependencyUnavailable, call_with_retries
+from query_cache import LRUCache, normalize_query
+from prewarm_caches import load_message_rows, prewarm, write_report
+from request_profiler import RequestProfiler, stage
+import queue
+import threading
+import time
+
+STARTUP_STARTED = time.monotonic()
 
 # Load environment variables
 load_dotenv()
@@ -21,8 +47,43 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Per-request deadline and per-stage timeout caps for outbound calls (seconds)
+CHAT_DEADLINE = float(os.getenv("CHAT_DEADLINE_SECONDS", "25"))
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT_SECONDS", "5"))
+COMPLETION_TIMEOUT = float(os.getenv("COMPLETION_TIMEOUT_SECONDS", "20"))
+LOG_TIMEOUT = float(os.getenv("LOG_TIMEOUT_SECONDS", "3"))
+
+# Clients are created by the background startup, after the port is bound
+client = None
+supabase = None
+supabase_log = None
+
+def init_clients():
+    global client, supabase, supabase_log
+    # Retries are handled per stage by call_with_retries, within the deadline
+    client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    # Separate client so message logging cannot hold a request for long
+    supabase_log = create_client(
+        SUPABASE_URL,
+        SUPABASE_KEY,
+        options=ClientOptions(postgrest_client_timeout=LOG_TIMEOUT)
+    )
+
+OPENAI_RETRYABLE = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError
+)
+
+# One circuit breaker per dependency
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+breakers = {
+    name: CircuitBreaker(name, BREAKER_FAILURES, BREAKER_RESET)
+    for name in ('openai_embeddings', 'openai_chat', 'supabase_messages')
+}
 
 # Load URL mappings
 with open('url_mappings.json', 'r', encoding='utf-8') as f:
@@ -36,11 +97,85 @@ def load_embeddings():
     vectors = np.array([row["embedding"] for row in data])
     texts = [row["content"] for row in data]
     sources = [row["source"] for row in data]
+    metadata = build_chunk_metadata(
+        data,
+        url_mappings.get("source_metadata", {}),
+        url_mappings.get("default_metadata", {})
+    )
+    corpus = CorpusIndex(
+        vectors, texts, sources, metadata,
+        mmap_path=os.getenv("CORPUS_TEXT_MMAP_PATH"),
+        search_threads=int(os.getenv("SEARCH_THREADS", "1"))
+    )
+    
+    # Resident memory per chunk: plain str lists vs the compact store
+    if texts:
+        before = list_storage_bytes(texts, sources) / len(texts)
+        after = corpus.chunks.resident_bytes() / len(texts)
+        print(f"Chunk text/source storage: {before:.0f} -> {after:.0f} bytes per chunk")
     print(f"Loaded {len(vectors)} embeddings")
-    return vectors, texts, sources
+    return corpus
+
+# Built in the background (see run_startup); /api/ready reports when it is
+index = None
+# Bumped on every (re)load so cached/coalesced work never crosses corpus versions
+index_version = 0
+index_ready = threading.Event()
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "5"))
+startup_state = {'phase': 'starting', 'error': None, 'timings_ms': {}}
+
+# Identical in-flight questions share one embedding + completion
+inflight = SingleFlight()
+
+# Query embeddings (keyed by the normalized question, like the pre-warm
+# report counts them) and finished answers (keyed like coalescing, so they
+# never cross corpus versions)
+embedding_cache = LRUCache(max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "5000")))
+answer_cache = LRUCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "500")),
+    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+)
+
+# Confident short answers go to a faster model, the rest to gpt-4o
+cascade = CascadePolicy.from_env()
+cascade_stats = CascadeStats()
+
+# Bounded concurrency for /api/chat, with optional per-session rate limits
+SESSION_RATE_LIMIT = int(os.getenv("SESSION_RATE_LIMIT_PER_MINUTE", "0"))
+admission = AdmissionController(
+    max_in_flight=int(os.getenv("CHAT_MAX_IN_FLIGHT", "8")),
+    max_queue=int(os.getenv("CHAT_MAX_QUEUE", "16")),
+    queue_timeout=float(os.getenv("CHAT_QUEUE_TIMEOUT_SECONDS", "2")),
+    retry_after=int(os.getenv("CHAT_RETRY_AFTER_SECONDS", "2")),
+    rate_limiter=SessionRateLimiter(
+        SESSION_RATE_LIMIT,
+        burst=int(os.getenv("SESSION_RATE_BURST", "5"))
+    ) if SESSION_RATE_LIMIT > 0 else None
+)
 
-# Load embeddings initially
-vectors, texts, sources = load_embeddings()
+# Per-session retrieval context for follow-up questions
+FOLLOWUP_MAX_WORDS = int(os.getenv("FOLLOWUP_MAX_WORDS", "6"))
+FOLLOWUP_MIN_SIMILARITY = float(os.getenv("FOLLOWUP_MIN_SIMILARITY", "0.4"))
+sessions = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX_ENTRIES", "10000")),
+    ttl_seconds=int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+)
+
+# Common abbreviations in Romanian academic context
+ABBREVIATIONS = {
+    'fse': 'Facultatea de Științe Economice',
+    'ulbs': 'Universitatea Lucian Blaga Sibiu',
+    'licenta': 'lucrare de licență',
+    'master': 'lucrare de master disertație',
+    'camin': 'cămin dormitor cazare',
+    'bursa': 'bursă financiară',
+    'erasmus': 'erasmus mobilitate internațională',
+    'orar': 'orar program cursuri',
+    'restanta': 'restanță examen',
+    'sesiune': 'sesiune examen',
+    'admitere': 'admitere înmatriculare',
+    'taxa': 'taxă școlarizare',
+}
 
 # Query preprocessing function
 def preprocess_query(query: str) -> str:
@@ -48,22 +183,6 @@ def preprocess_query(query: str) -> str:
     Enhance query for better embedding matching
     Expands common abbreviations and adds context
     """
-    # Common abbreviations in Romanian academic context
-    abbreviations = {
-        'fse': 'Facultatea de Științe Economice',
-        'ulbs': 'Universitatea Lucian Blaga Sibiu',
-        'licenta': 'lucrare de licență',
-        'master': 'lucrare de master disertație',
-        'camin': 'cămin dormitor cazare',
-        'bursa': 'bursă financiară',
-        'erasmus': 'erasmus mobilitate internațională',
-        'orar': 'orar program cursuri',
-        'restanta': 'restanță examen',
-        'sesiune': 'sesiune examen',
-        'admitere': 'admitere înmatriculare',
-        'taxa': 'taxă școlarizare',
-    }
-    
     query_lower = query.lower()
     expanded_terms = []
     
@@ -71,13 +190,23 @@ def preprocess_query(query: str) -> str:
     expanded_terms.append(query)
     
     # Expand known abbreviations
-    for abbrev, expansion in abbreviations.items():
+    for abbrev, expansion in ABBREVIATIONS.items():
         if abbrev in query_lower:
             expanded_terms.append(expansion)
     
     # Return enhanced query
     return ' '.join(expanded_terms)
 
+# Fixed-answer intents served without embedding or LLM calls
+with open('intents.json', 'r', encoding='utf-8') as f:
+    intent_config = json.load(f)
+
+intent_router = IntentRouter(
+    intent_config["intents"],
+    ABBREVIATIONS,
+    max_words=intent_config.get("max_words", 8)
+)
+
 # System prompt
 SYSTEM_PROMPT = """# System Role: Faculty of Economic Sciences Information Assistant
 
@@ -260,11 +389,499 @@ Before responding:
 - Have I included relevant links as plain URLs?
 """
 
-def cosine_similarity(a, b):
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+# Standing instructions are part of the static prefix, so they are sent
+# byte-identical with every request and can be served from the prompt cache
+STANDING_INSTRUCTIONS = """## Per-Request Instructions
+
+Each user message contains the RETRIEVED CONTEXT, PRIMARY SOURCE, RELATED URLS and the USER QUESTION (preceded by the previous question and answer for follow-ups).
+
+INSTRUCTIONS:
+- Use ALL the provided context chunks to form a complete answer
+- Cross-reference information across chunks when relevant
+- If the context partially answers the question, provide what you know and acknowledge gaps
+- Include specific details: dates, numbers, names, requirements, deadlines
+- Add relevant URLs from the context
+"""
+
+prompt_builder = PromptBuilder(
+    SYSTEM_PROMPT,
+    STANDING_INSTRUCTIONS,
+    input_token_budget=int(os.getenv("PROMPT_TOKEN_BUDGET", "8000"))
+)
+
+def parse_filter(raw_filter):
+    """Validate the optional metadata filter sent by the client"""
+    if not raw_filter:
+        return {}
+    if not isinstance(raw_filter, dict):
+        raise ValueError("filter must be an object")
+    unknown = [field for field in raw_filter if field not in METADATA_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown filter fields: {', '.join(unknown)}")
+    for field, values in raw_filter.items():
+        if isinstance(values, str):
+            continue
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            raise ValueError(f"filter.{field} must be a string or a list of strings")
+    return raw_filter
+
+NO_CONTEXT_RESPONSE = "Îmi pare rău, dar nu am găsit informații relevante în baza mea de date pentru această întrebare. Vă recomand să contactați direct secretariatul la economice@ulbsibiu.ro sau să vizitați site-ul facultății la https://economice.ulbsibiu.ro/"
+
+def no_context_result(filters, degraded=False):
+    return {
+        'response': NO_CONTEXT_RESPONSE,
+        'source': None,
+        'url': None,
+        'confidence': 'low',
+        'chunks_used': 0,
+        'partitions': filters or None,
+        'degraded': degraded,
+        'retrieval': None
+    }
+
+def embed_query(message, preprocessed_query, deadline):
+    """
+    Embedding of the preprocessed query, cached under the normalized
+    message; raises DependencyUnavailable
+    """
+    cache_key = normalize_query(message)
+    query_vector = embedding_cache.get(cache_key)
+    if query_vector is None:
+        with stage('embedding'):
+            query_vector = call_with_retries(
+                lambda timeout: client.with_options(timeout=timeout).embeddings.create(
+                    model="text-embedding-3-small",
+                    input=preprocessed_query
+                ).data[0].embedding,
+                breakers['openai_embeddings'],
+                deadline,
+                EMBEDDING_TIMEOUT,
+                retry_on=OPENAI_RETRYABLE
+            )
+        embedding_cache.put(cache_key, query_vector)
+    return query_vector
+
+def generate_answer(message, preprocessed_query, filters, routed, deadline, previous=None):
+    """
+    Retrieve context and generate an answer. With `previous` set (a
+    follow-up), the previous turn's chunks are merged with a fresh search
+    in the same partitions.
+    Returns a result dict that may be shared between coalesced requests,
+    so callers must not mutate it. When OpenAI is unavailable or the
+    deadline runs out, the "no relevant info" answer is returned instead.
+    """
+    # Find top-k most similar chunks (retrieve more context)
+    TOP_K = 5
+    SIMILARITY_THRESHOLD = 0.55  # Lowered for larger chunks (they have slightly lower similarity scores)
+    
+    # One corpus for the whole request, even if a reload swaps it meanwhile.
+    # The version is read first: a reload assigns the index, then bumps it
+    version = index_version
+    corpus = index
+    
+    # Generate embedding for the query
+    try:
+        query_vector = embed_query(message, preprocessed_query, deadline)
+    except DependencyUnavailable as e:
+        print(f"Embedding skipped: {e}")
+        return no_context_result(filters, degraded=True)
+    
+    if previous is not None:
+        # Stay in the partitions the conversation is about
+        filters = filters or previous['filters']
+    
+    with stage('search'):
+        top_k_indices, top_k_scores = corpus.search(query_vector, TOP_K, filters)
+        
+        # A routed guess that finds nothing relevant falls back to the full corpus
+        if routed and filters and (
+            len(top_k_scores) == 0 or top_k_scores[0] < SIMILARITY_THRESHOLD
+        ):
+            filters = {}
+            top_k_indices, top_k_scores = corpus.search(query_vector, TOP_K)
+        
+        if previous is not None:
+            # Keep the previous turn's chunks alongside the fresh matches,
+            # scored against this question so thresholds and confidence
+            # reflect how well they answer it
+            merged = {int(idx): float(score) for idx, score in zip(top_k_indices, top_k_scores)}
+            previous_ids = [idx for idx in previous['chunk_ids'] if idx not in merged]
+            if previous_ids:
+                rescored = corpus.score(query_vector, previous_ids)
+                merged.update(zip(previous_ids, (float(score) for score in rescored)))
+            ranked = sorted(merged.items(), key=lambda item: item[1], reverse=True)[:TOP_K]
+            top_k_indices = [idx for idx, _ in ranked]
+            top_k_scores = [score for _, score in ranked]
+    
+    # Filter by similarity threshold
+    relevant_chunks = []
+    relevant_scores = []
+    relevant_sources_list = []
+    relevant_urls = []
+    
+    for idx, score in zip(top_k_indices, top_k_scores):
+        if score >= SIMILARITY_THRESHOLD:
+            relevant_chunks.append(corpus.text(idx))
+            relevant_scores.append(float(score))
+            relevant_sources_list.append(corpus.source(idx))
+            
+            source_url = url_mappings["source_to_url"].get(
+                corpus.source(idx),
+                url_mappings.get("fallback_url", "")
+            )
+            relevant_urls.append(source_url)
+    
+    retrieval = {
+        'query_vector': query_vector,
+        'chunk_ids': top_k_indices,
+        'scores': top_k_scores,
+        'filters': filters,
+        'index_version': version
+    }
+    
+    # Check if we have relevant context
+    if not relevant_chunks:
+        return no_context_result(filters)
+    
+    primary_source = relevant_sources_list[0]
+    primary_url = relevant_urls[0]
+    
+    # Give the model the previous turn when answering a follow-up
+    previous_turn = ""
+    if previous is not None:
+        previous_turn = f"""PREVIOUS QUESTION:
+{previous['query']}
+
+PREVIOUS ANSWER:
+{previous['answer']}
+
+"""
+    
+    # Static system prefix + volatile context/question, within the token budget
+    with stage('prompt'):
+        messages, chunks_kept, prompt_tokens = prompt_builder.build(
+            relevant_chunks,
+            relevant_sources_list,
+            relevant_urls,
+            message,
+            previous_turn
+        )
+    
+    # Pick the generation tier from retrieval confidence
+    model_tier, model, _ = cascade.choose(message, relevant_scores[:chunks_kept])
+    
+    # Get response from OpenAI
+    with stage('completion'):
+        try:
+            response = call_with_retries(
+                lambda timeout: client.with_options(timeout=timeout).chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0.3  # Lower temperature for more factual responses
+                ),
+                breakers['openai_chat'],
+                deadline,
+                COMPLETION_TIMEOUT,
+                retry_on=OPENAI_RETRYABLE
+            )
+        except DependencyUnavailable as e:
+            print(f"Completion skipped: {e}")
+            return no_context_result(filters, degraded=True)
+    # Counted here, once per model call; cached and coalesced answers reuse it
+    cascade_stats.record(model_tier)
+    
+    # Tokens the provider served from its prompt cache, when reported
+    usage = getattr(response, 'usage', None)
+    details = getattr(usage, 'prompt_tokens_details', None)
+    prompt_tokens['cached'] = getattr(details, 'cached_tokens', None)
+    
+    assistant_message = response.choices[0].message.content
+    
+    # Calculate confidence based on similarity scores
+    # Adjusted thresholds for larger chunks (1200 chars have slightly lower similarity)
+    max_similarity = top_k_scores[0]
+    confidence = 'high' if max_similarity > 0.65 else 'medium' if max_similarity > 0.57 else 'low'
+    
+    return {
+        'response': assistant_message,
+        'source': primary_source,
+        'url': primary_url,
+        'confidence': confidence,
+        'chunks_used': chunks_kept,
+        'partitions': filters or None,
+        'model_tier': model_tier,
+        'prompt_tokens': prompt_tokens,
+        'retrieval': retrieval
+    }
+
+class SupabaseTransientError(Exception):
+    """A PostgREST error worth retrying: database unreachable or overloaded"""
+
+# PostgREST/Postgres codes for outages; anything else (schema, RLS,
+# constraint violations) is a permanent 4xx that retrying cannot fix
+POSTGREST_TRANSIENT_CODES = {
+    'PGRST000', 'PGRST001', 'PGRST002', 'PGRST003',  # database connection/pool
+    '40001', '40P01',                                # serialization failure, deadlock
+    '53300', '57014', '57P01', '57P03'               # too many connections, cancelled, shutdown
+}
+
+def is_transient_postgrest_error(error):
+    code = str(getattr(error, 'code', '') or '')
+    return (
+        code in POSTGREST_TRANSIENT_CODES
+        or (len(code) == 5 and code.startswith('08'))  # connection exceptions
+        or (len(code) == 3 and code.startswith('5'))   # HTTP 5xx without a JSON body
+    )
+
+def execute_postgrest(query):
+    """Run a PostgREST query, raising SupabaseTransientError for retryable failures"""
+    try:
+        return query.execute()
+    except PostgrestAPIError as e:
+        if is_transient_postgrest_error(e):
+            raise SupabaseTransientError(e) from e
+        raise
+
+SUPABASE_RETRYABLE = (httpx.TransportError, SupabaseTransientError)
+
+# Cleared when the messages table turns out to have no model_tier column
+messages_model_tier_supported = True
+
+def missing_column(error, column):
+    """True when PostgREST rejected a write because `column` does not exist"""
+    code = getattr(error, 'code', None)
+    text = getattr(error, 'message', None) or str(error)
+    return code in ('PGRST204', '42703') and column in text
+
+def log_message(session_id, message, assistant_message, source, url, model_tier=None, deadline=None):
+    """
+    Store a message in Supabase; returns its id, or None when logging
+    failed or was skipped (breaker open, request deadline spent)
+    """
+    row = {
+        "session_id": session_id,
+        "user_message": message,
+        "assistant_message": assistant_message,
+        "retrieved_source": source,
+        "retrieved_url": url
+    }
+    if model_tier and messages_model_tier_supported:
+        row["model_tier"] = model_tier
+    if supabase_log is None:
+        return None
+    
+    def insert(timeout):
+        global messages_model_tier_supported
+        try:
+            return execute_postgrest(supabase_log.table("messages").insert(row))
+        except PostgrestAPIError as e:
+            if "model_tier" not in row or not missing_column(e, "model_tier"):
+                raise
+            # Database without the migration: keep logging, without the tier
+            print("messages.model_tier is missing (run supabase/migrations); logging without it")
+            messages_model_tier_supported = False
+            del row["model_tier"]
+            return execute_postgrest(supabase_log.table("messages").insert(row))
+    
+    if deadline is None:
+        # Off the request path (queued intent logs): room for one retry
+        deadline = Deadline(LOG_TIMEOUT * 2 + 1)
+        max_attempts = 2
+    else:
+        # On the request path: a single attempt
+        max_attempts = 1
+    
+    try:
+        # supabase_log always waits up to LOG_TIMEOUT, so an attempt only
+        # starts when all of it fits in the deadline
+        msg_result = call_with_retries(
+            insert,
+            breakers['supabase_messages'],
+            deadline,
+            LOG_TIMEOUT,
+            retry_on=SUPABASE_RETRYABLE,
+            max_attempts=max_attempts,
+            min_timeout=LOG_TIMEOUT
+        )
+        
+        return msg_result.data[0]['id'] if msg_result.data else None
+    except Exception as e:
+        print(f"Error storing message: {e}")
+        return None
+
+# Intent hits are logged off the request path by a few workers; when the
+# queue is full (e.g. Supabase is slow during a spike) rows are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "200"))
+LOG_WORKERS = int(os.getenv("LOG_WORKERS", "2"))
+log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+log_queue_lock = threading.Lock()
+log_queue_stats = {'queued': 0, 'dropped': 0}
+
+def log_worker():
+    while True:
+        log_message(*log_queue.get())
+
+def start_log_workers():
+    for _ in range(LOG_WORKERS):
+        threading.Thread(target=log_worker, name='log', daemon=True).start()
+
+def log_message_async(*args):
+    """Queue a log_message call; returns False when the row was dropped"""
+    try:
+        log_queue.put_nowait(args)
+        dropped = False
+    except queue.Full:
+        dropped = True
+    with log_queue_lock:
+        log_queue_stats['dropped' if dropped else 'queued'] += 1
+    return not dropped
+
+def answer_cache_key(message, filters, routed):
+    """Key shared by the answer cache and request coalescing"""
+    return (
+        normalize_query(message),
+        index_version,
+        json.dumps(filters, sort_keys=True) if not routed else None
+    )
+
+def admitted(fn):
+    """
+    Run expensive work (OpenAI calls) in an admission slot. Raises
+    AdmissionRejected when the server is at capacity.
+    """
+    with admission.slot():
+        return fn()
+
+def answer_with_rag(message, session_id, filters, deadline):
+    """
+    Retrieval-augmented answer for one /api/chat request. Only work that
+    calls OpenAI takes an admission slot: answer-cache hits and coalesced
+    followers never use capacity.
+    """
+    with stage('preprocess'):
+        # Preprocess query for better matching
+        preprocessed_query = preprocess_query(message)
+    
+        # An explicit client filter wins; otherwise route by query keywords
+        routed = not filters
+        if routed:
+            filters = route_partitions(
+                preprocessed_query,
+                url_mappings.get("doc_type_keywords", {})
+            )
+    
+    def embed_or_none():
+        try:
+            if normalize_query(message) in embedding_cache:
+                return embed_query(message, preprocessed_query, deadline)
+            return admitted(lambda: embed_query(message, preprocessed_query, deadline))
+        except DependencyUnavailable:
+            return None
+    
+    # A short follow-up on the same topic builds on the previous turn's context
+    previous = sessions.get(session_id, index_version)
+    follow_up = routed and is_follow_up(
+        message,
+        previous,
+        filters.get('doc_type', []),
+        embed_or_none,
+        FOLLOWUP_MAX_WORDS,
+        FOLLOWUP_MIN_SIMILARITY
+    )
+    
+    if follow_up:
+        # Depends on this session's history, so it is never shared
+        result = admitted(lambda: generate_answer(
+            message, preprocessed_query, filters, routed, deadline, previous
+        ))
+        coalesced = False
+        cached = False
+    else:
+        # Identical questions against the same corpus share one computation;
+        # only its leader holds a slot, followers just wait for the result
+        key = answer_cache_key(message, filters, routed)
+        result = answer_cache.get(key)
+        cached = result is not None
+        coalesced = False
+        if result is None:
+            result, coalesced = inflight.run(
+                key,
+                lambda: admitted(
+                    lambda: generate_answer(message, preprocessed_query, filters, routed, deadline)
+                )
+            )
+            if not result.get('degraded'):
+                answer_cache.put(key, result)
+    
+    retrieval = result['retrieval']
+    
+    if result['source'] is None:
+        return jsonify({
+            'response': result['response'],
+            'source': None,
+            'url': None,
+            'confidence': 'low',
+            'partitions': result['partitions'],
+            'degraded': result['degraded']
+        })
+    
+    sessions.put(
+        session_id,
+        message,
+        retrieval['query_vector'],
+        retrieval['chunk_ids'],
+        retrieval['scores'],
+        retrieval['filters'],
+        result['response'],
+        retrieval['index_version']
+    )
+    
+    # Store in database (optional)
+    with stage('logging'):
+        message_id = log_message(
+            session_id,
+            message,
+            result['response'],
+            result['source'],
+            result['url'],
+            result['model_tier'],
+            deadline
+        )
+    
+    with stage('serialize'):
+        response = jsonify({
+            'response': result['response'],
+            'source': result['source'],
+            'url': result['url'],
+            'message_id': message_id,
+            'confidence': result['confidence'],
+            'chunks_used': result['chunks_used'],
+            'partitions': result['partitions'],
+            'model_tier': result['model_tier'],
+            'prompt_tokens': result['prompt_tokens'],
+            'context_reused': bool(follow_up),
+            'cached': cached,
+            'coalesced': coalesced
+        })
+    return response
+
+# Opt-in profiling of /api/chat; disabled unless PROFILE_TOKEN is set
+request_profiler = RequestProfiler(
+    os.getenv("PROFILE_DIR", "profiles"),
+    admin_token=os.getenv("PROFILE_TOKEN")
+)
+
+def profiled(view):
+    return request_profiler.wrap(
+        view,
+        view.__name__,
+        lambda: (request.headers.get('X-Profile'), request.headers.get('X-Profile-Token'))
+    )
 
 @app.route('/api/chat', methods=['POST'])
+@profiled
 def chat():
+    deadline = Deadline(CHAT_DEADLINE)
     try:
         data = request.json
         message = data.get('message', '')
@@ -273,135 +890,266 @@ def chat():
         if not message:
             return jsonify({'error': 'Message is required'}), 400
         
-        # Preprocess query for better matching
-        preprocessed_query = preprocess_query(message)
-        
-        # Generate embedding for the query
-        query_vector = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=preprocessed_query
-        ).data[0].embedding
-        
-        # Find top-k most similar chunks (retrieve more context)
-        TOP_K = 5
-        SIMILARITY_THRESHOLD = 0.55  # Lowered for larger chunks (they have slightly lower similarity scores)
-        
-        similarities = [cosine_similarity(query_vector, v) for v in vectors]
-        
-        # Get top-k indices
-        top_k_indices = np.argsort(similarities)[-TOP_K:][::-1]
-        
-        # Filter by similarity threshold
-        relevant_chunks = []
-        relevant_sources_list = []
-        relevant_urls = []
-        
-        for idx in top_k_indices:
-            if similarities[idx] >= SIMILARITY_THRESHOLD:
-                relevant_chunks.append(texts[idx])
-                relevant_sources_list.append(sources[idx])
-                
-                source_url = url_mappings["source_to_url"].get(
-                    sources[idx],
-                    url_mappings.get("fallback_url", "")
-                )
-                relevant_urls.append(source_url)
+        try:
+            filters = parse_filter(data.get('filter'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Check if we have relevant context
-        if not relevant_chunks:
+        # Known fixed-answer intents are answered locally
+        intent = None if filters else intent_router.match(message)
+        if intent:
+            # Logging happens off the request path to keep the reply instant
+            log_message_async(session_id, message, intent['response'], None, intent['url'])
             return jsonify({
-                'response': "Îmi pare rău, dar nu am găsit informații relevante în baza mea de date pentru această întrebare. Vă recomand să contactați direct secretariatul la economice@ulbsibiu.ro sau să vizitați site-ul facultății la https://economice.ulbsibiu.ro/",
+                'response': intent['response'],
                 'source': None,
-                'url': None,
-                'confidence': 'low'
+                'url': intent['url'],
+                'message_id': None,
+                'confidence': 'high',
+                'chunks_used': 0,
+                'intent': intent['intent']
             })
         
-        # Combine chunks into context
-        combined_context = "\n\n---\n\n".join(relevant_chunks)
-        primary_source = relevant_sources_list[0]
-        primary_url = relevant_urls[0]
-        
-        # Create prompt with multiple contexts
-        user_prompt = f"""RETRIEVED CONTEXT (Top {len(relevant_chunks)} most relevant chunks):
-
-{combined_context}
-
-PRIMARY SOURCE: {primary_source}
-RELATED URLS: {', '.join(set(relevant_urls))}
-
-USER QUESTION:
-{message}
-
-INSTRUCTIONS:
-- Use ALL the provided context chunks to form a complete answer
-- Cross-reference information across chunks when relevant
-- If the context partially answers the question, provide what you know and acknowledge gaps
-- Include specific details: dates, numbers, names, requirements, deadlines
-- Add relevant URLs from the context"""
-        
-        # Get response from OpenAI
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3  # Lower temperature for more factual responses
-        )
-        
-        assistant_message = response.choices[0].message.content
+        # Retrieval needs the index; intents above are served while warming up
+        if not index_ready.is_set():
+            response = jsonify({
+                'status': 'warming_up',
+                'error': 'The assistant is starting up, please retry shortly',
+                'phase': startup_state['phase']
+            })
+            response.headers['Retry-After'] = str(int(STARTUP_RETRY_SECONDS))
+            return response, 503
         
-        # Calculate confidence based on similarity scores
-        # Adjusted thresholds for larger chunks (1200 chars have slightly lower similarity)
-        max_similarity = similarities[top_k_indices[0]]
-        confidence = 'high' if max_similarity > 0.65 else 'medium' if max_similarity > 0.57 else 'low'
+        # Only the RAG prompt is budgeted; checked after warm-up, when the
+        # tokenizer is already loaded
+        if not prompt_builder.question_fits(message):
+            return jsonify({
+                'error': f'Message is too long (max {prompt_builder.max_question_tokens} tokens)'
+            }), 413
         
-        # Store in database (optional)
+        # Rate-limit the session here; answer_with_rag takes a slot only for
+        # the work that calls OpenAI
         try:
-            msg_result = supabase.table("messages").insert({
-                "session_id": session_id,
-                "user_message": message,
-                "assistant_message": assistant_message,
-                "retrieved_source": primary_source,
-                "retrieved_url": primary_url
-            }).execute()
-            
-            message_id = msg_result.data[0]['id'] if msg_result.data else None
-        except Exception as e:
-            print(f"Error storing message: {e}")
-            message_id = None
-        
-        return jsonify({
-            'response': assistant_message,
-            'source': primary_source,
-            'url': primary_url,
-            'message_id': message_id,
-            'confidence': confidence,
-            'chunks_used': len(relevant_chunks)
-        })
+            admission.check_rate(session_id)
+            return answer_with_rag(message, session_id, filters, deadline)
+        except AdmissionRejected as e:
+            response = jsonify({'error': e.message, 'retry_after': e.retry_after})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, e.status_code
         
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/profile', methods=['POST'])
+def arm_profiling():
+    """Profile the next N /api/chat requests: {"requests": N, "mode": "deterministic"|"sampling"}"""
+    if not request_profiler.authorized(request.headers.get('X-Profile-Token')):
+        return jsonify({'error': 'Profiling is disabled or the token is invalid'}), 403
+    data = request.json or {}
+    try:
+        request_profiler.arm(data.get('requests', 1), data.get('mode', 'deterministic'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'status': 'armed',
+        'remaining': request_profiler.remaining,
+        'mode': request_profiler.mode,
+        'output_dir': request_profiler.output_dir
+    })
+
+@app.route('/api/live', methods=['GET'])
+def live():
+    """Liveness: the process is up and serving HTTP"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness: clients are built and the index is loaded"""
+    body = {
+        'status': 'ready' if index_ready.is_set() else 'warming_up',
+        'phase': startup_state['phase'],
+        'error': startup_state['error'],
+        'timings_ms': startup_state['timings_ms']
+    }
+    return jsonify(body), 200 if index_ready.is_set() else 503
+
 @app.route('/api/health', methods=['GET'])
 def health():
-    return jsonify({'status': 'ok', 'embeddings_loaded': len(vectors)})
+    if not index_ready.is_set():
+        return jsonify({
+            'status': 'warming_up',
+            'phase': startup_state['phase'],
+            'embeddings_loaded': 0
+        })
+    return jsonify({
+        'status': 'ok',
+        'embeddings_loaded': len(index),
+        'partitions': index.partition_sizes()['doc_type'],
+        'sessions': sessions.stats(),
+        'coalescing': inflight.stats(),
+        'embedding_cache': embedding_cache.stats(),
+        'answer_cache': answer_cache.stats(),
+        'intent_router': intent_router.stats(),
+        'model_cascade': cascade_stats.as_dict(),
+        'admission': admission.stats(),
+        'log_queue': {**log_queue_stats, 'pending': log_queue.qsize(), 'max_pending': LOG_QUEUE_SIZE},
+        'breakers': {name: breaker.stats() for name, breaker in breakers.items()}
+    })
 
 @app.route('/api/reload-embeddings', methods=['POST'])
 def reload_embeddings():
     """Reload embeddings from Supabase"""
-    global vectors, texts, sources
+    global index, index_version
+    if not index_ready.is_set():
+        return jsonify({'status': 'warming_up', 'error': 'Initial load still running'}), 503
     try:
-        vectors, texts, sources = load_embeddings()
+        index = load_embeddings()
+        index_version += 1
+        # Stored chunk ids and answers belong to the old index
+        sessions.clear()
+        answer_cache.clear()
+        if PREWARM_ENABLED:
+            threading.Thread(target=run_prewarm, name='prewarm', daemon=True).start()
         return jsonify({
             'status': 'success',
-            'embeddings_loaded': len(vectors)
+            'embeddings_loaded': len(index)
         })
     except Exception as e:
         return jsonify({'status': 'error', 'error': str(e)}), 500
 
+def run_startup_phase(name, step):
+    """Run one startup phase, retrying until it succeeds; returns its result"""
+    startup_state['phase'] = name
+    started = time.monotonic()
+    while True:
+        try:
+            result = step()
+            break
+        except Exception as e:
+            startup_state['error'] = f"{name}: {e}"
+            print(f"Startup phase '{name}' failed: {e} (retrying in {STARTUP_RETRY_SECONDS:.0f}s)")
+            time.sleep(STARTUP_RETRY_SECONDS)
+    startup_state['error'] = None
+    startup_state['timings_ms'][name] = round((time.monotonic() - started) * 1000)
+    return result
+
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "true").lower() == "true"
+# Total time pre-warming may take, and the cap for one batch embedding call
+PREWARM_BUDGET = float(os.getenv("PREWARM_BUDGET_SECONDS", "120"))
+PREWARM_EMBEDDING_TIMEOUT = float(os.getenv("PREWARM_EMBEDDING_TIMEOUT_SECONDS", "20"))
+
+def run_prewarm(on_embedded=None):
+    """
+    Fill the embedding and answer caches from the messages log, within
+    PREWARM_BUDGET; `on_embedded()` runs once the embedding pass is over
+    """
+    started = time.monotonic()
+    budget = Deadline(PREWARM_BUDGET)
+    try:
+        # The messages query counts against the budget too
+        export_path = os.getenv("PREWARM_EXPORT_PATH")
+        messages_client = None if export_path else create_client(
+            SUPABASE_URL,
+            SUPABASE_KEY,
+            options=ClientOptions(postgrest_client_timeout=budget.remaining())
+        )
+        rows = load_message_rows(
+            messages_client,
+            export_path=export_path,
+            limit=int(os.getenv("PREWARM_MESSAGE_LIMIT", "5000"))
+        )
+        
+        def answer(query):
+            preprocessed = preprocess_query(query)
+            filters = route_partitions(preprocessed, url_mappings.get("doc_type_keywords", {}))
+            deadline = Deadline(min(CHAT_DEADLINE, budget.remaining()))
+            result = generate_answer(query, preprocessed, filters, True, deadline)
+            return None if result.get('degraded') else result
+        
+        def embed_batch(texts):
+            return call_with_retries(
+                lambda timeout: [
+                    item.embedding for item in client.with_options(timeout=timeout).embeddings.create(
+                        model="text-embedding-3-small",
+                        input=texts
+                    ).data
+                ],
+                breakers['openai_embeddings'],
+                budget,
+                PREWARM_EMBEDDING_TIMEOUT,
+                retry_on=OPENAI_RETRYABLE
+            )
+        
+        report = prewarm(
+            rows,
+            preprocess_query,
+            embed_batch,
+            embedding_cache,
+            answer_fn=answer,
+            answer_cache=answer_cache,
+            answer_key=lambda query: answer_cache_key(query, {}, True),
+            skip=intent_router.would_match,
+            query_limit=int(os.getenv("PREWARM_QUERY_LIMIT", "200")),
+            answer_limit=int(os.getenv("PREWARM_ANSWER_LIMIT", "25")),
+            deadline=budget,
+            on_embedded=on_embedded
+        )
+        write_report(report, os.getenv("PREWARM_REPORT_PATH", "prewarm_report.json"))
+        print(
+            f"Pre-warmed {report['distinct_hot_queries']} hot queries in "
+            f"{time.monotonic() - started:.1f}s (projected hit rate: "
+            f"embeddings {report['projected_embedding_hit_rate']:.0%}, "
+            f"answers {report['projected_answer_hit_rate']:.0%})"
+            + (" - stopped at the time budget" if report['stopped_early'] else "")
+        )
+    except Exception as e:
+        # A cold cache is slower, not broken
+        print(f"Cache pre-warm failed: {e}")
+
+def run_startup():
+    """Background startup: create clients, then build the index"""
+    global index, index_version
+    run_startup_phase('clients', init_clients)
+    # Loads the tokenizer (possibly a download) before the first request needs it
+    run_startup_phase('tokenizer', lambda: prompt_builder.static_tokens)
+    index = run_startup_phase('index', load_embeddings)
+    index_version += 1
+    if PREWARM_ENABLED:
+        startup_state['phase'] = 'prewarm'
+        prewarm_started = time.monotonic()
+        # Ready once query embeddings are warm; answers keep warming after that
+        run_prewarm(on_embedded=mark_ready)
+        startup_state['timings_ms']['prewarm'] = round((time.monotonic() - prewarm_started) * 1000)
+        print(f"Pre-warm finished in {startup_state['timings_ms']['prewarm']}ms")
+    mark_ready()
+
+def mark_ready():
+    """Flip readiness (once) and report the startup timings so far"""
+    if index_ready.is_set():
+        return
+    startup_state['phase'] = 'ready'
+    index_ready.set()
+    timings = ', '.join(f"{name}={ms}ms" for name, ms in startup_state['timings_ms'].items())
+    print(f"Ready: {timings}")
+
+def start_background():
+    """Start the logging workers and the background startup"""
+    start_log_workers()
+    threading.Thread(target=run_startup, name='startup', daemon=True).start()
+
+# Everything up to here is cheap; the slow part runs after the port is bound
+startup_state['timings_ms']['import'] = round((time.monotonic() - STARTUP_STARTED) * 1000)
+
 if __name__ == '__main__':
     print("Starting chatbot API server...")
-    print(f"Loaded {len(vectors)} embeddings")
-    app.run(debug=True, port=5001, host='127.0.0.1')
+    DEBUG = True
+    # With the debug reloader this file runs again in a child process
+    # (WERKZEUG_RUN_MAIN=true) that serves requests; the watching parent
+    # must not create clients, load the index or pre-warm
+    if not DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background()
+    app.run(debug=DEBUG, port=5001, host='127.0.0.1')
+else:
+    # Imported by a WSGI server (gunicorn, waitress, ...)
+    start_background()
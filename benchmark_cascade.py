@@ -0,0 +1,94 @@
+"""
+Benchmark the model cascade policy against a local stand-in backend
+Compares latency of the cascade with sending everything to the strong model,
+without calling OpenAI
+"""
+
+import os
+import time
+from types import SimpleNamespace
+
+from model_cascade import CascadePolicy
+
+# Simulated latency per model: fixed overhead + per output token
+MODEL_LATENCY_MS = {
+    "gpt-4o": (float(os.getenv("BENCH_STRONG_BASE_MS", "600")), float(os.getenv("BENCH_STRONG_TOKEN_MS", "12"))),
+    "gpt-4o-mini": (float(os.getenv("BENCH_FAST_BASE_MS", "250")), float(os.getenv("BENCH_FAST_TOKEN_MS", "5"))),
+}
+OUTPUT_TOKENS = 150
+
+# Representative questions with the similarity scores of the chunks that
+# passed the threshold (best first)
+test_cases = [
+    {"message": "Care este adresa căminului 1?", "scores": [0.74, 0.61]},
+    {"message": "Cât este bursa de performanță?", "scores": [0.71, 0.63, 0.58]},
+    {"message": "Email secretariat", "scores": [0.69]},
+    {"message": "Când începe sesiunea de iarnă?", "scores": [0.68, 0.66]},
+    {"message": "Compară programele de master disponibile", "scores": [0.67, 0.66, 0.64]},
+    {"message": "Explică pașii pentru înscrierea la Erasmus", "scores": [0.70, 0.62]},
+    {"message": "Ce este EduHub?", "scores": [0.62, 0.58]},
+    {"message": "Cine este decanul facultății?", "scores": [0.72, 0.59]},
+    {"message": "Which documents do I need for the social scholarship and when is the deadline for submitting them?", "scores": [0.69, 0.60]},
+    {"message": "Câte locuri are căminul 3?", "scores": [0.76, 0.60, 0.57]},
+]
+
+
+class StandInClient:
+    """Mimics client.chat.completions.create with simulated latency"""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, temperature=None):
+        base_ms, token_ms = MODEL_LATENCY_MS[model]
+        time.sleep((base_ms + token_ms * OUTPUT_TOKENS) / 1000)
+        return SimpleNamespace(choices=[
+            SimpleNamespace(message=SimpleNamespace(content=f"[{model}] stand-in answer"))
+        ])
+
+
+def run(policy, stand_in):
+    latencies = []
+    tiers = {"fast": 0, "strong": 0}
+    for case in test_cases:
+        tier, model, _ = policy.choose(case["message"], case["scores"])
+        tiers[tier] += 1
+        start = time.perf_counter()
+        stand_in.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": case["message"]}],
+            temperature=0.3
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "tiers": tiers,
+        "mean_ms": sum(latencies) / len(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+    }
+
+
+def main():
+    stand_in = StandInClient()
+    policies = {
+        "strong only": CascadePolicy(enabled=False),
+        "cascade": CascadePolicy.from_env(),
+    }
+
+    print("⏱️  Model cascade benchmark (stand-in backend)")
+    print("=" * 80)
+    for case in test_cases:
+        tier, model, reason = policies["cascade"].choose(case["message"], case["scores"])
+        print(f"{tier:6} {model:12} {reason:32} {case['message'][:40]}")
+
+    print("=" * 80)
+    results = {name: run(policy, stand_in) for name, policy in policies.items()}
+    for name, result in results.items():
+        print(f"{name:12} tiers={result['tiers']} mean={result['mean_ms']:.0f}ms p95={result['p95_ms']:.0f}ms")
+
+    saved = results["strong only"]["mean_ms"] - results["cascade"]["mean_ms"]
+    print(f"\n📉 Mean latency saved by the cascade: {saved:.0f}ms per answer")
+
+
+if __name__ == "__main__":
+    main()
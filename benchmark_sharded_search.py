@@ -0,0 +1,76 @@
+"""
+Benchmark sharded exact search across thread counts
+Scores random normalized vectors (text-embedding-3-small width by default)
+with 1..16 search threads and reports median latency and speedup over the
+single-threaded scan. Results are checked against the single-threaded top-k.
+
+Usage:
+    OPENBLAS_NUM_THREADS=1 python benchmark_sharded_search.py [sizes...]
+e.g. `python benchmark_sharded_search.py 100000 1000000`
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from corpus_index import CorpusIndex
+
+DIMENSIONS = int(os.getenv("BENCH_DIMENSIONS", "1536"))
+THREAD_COUNTS = [int(t) for t in os.getenv("BENCH_THREADS", "1,2,4,8,16").split(",")]
+QUERIES = int(os.getenv("BENCH_QUERIES", "20"))
+TOP_K = 5
+DEFAULT_SIZES = [100_000, 250_000, 500_000, 1_000_000]
+
+
+def random_vectors(n, rng, batch=50_000):
+    vectors = np.empty((n, DIMENSIONS), dtype=np.float32)
+    for start in range(0, n, batch):
+        vectors[start:start + batch] = rng.standard_normal(
+            (min(batch, n - start), DIMENSIONS), dtype=np.float32
+        )
+    return vectors
+
+
+def median_ms(index, queries):
+    index.search(queries[0], TOP_K)  # warm-up
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, TOP_K)
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or DEFAULT_SIZES
+    rng = np.random.default_rng(42)
+    queries = rng.standard_normal((QUERIES, DIMENSIONS), dtype=np.float32)
+
+    print(f"⏱️  Sharded exact search benchmark ({DIMENSIONS} dims, top-{TOP_K}, "
+          f"{os.cpu_count()} cores available)")
+    print("=" * 80)
+    for n in sizes:
+        vectors = random_vectors(n, rng)
+        texts = [""] * n
+        sources = ["bench"] * n
+
+        baseline = None
+        for threads in THREAD_COUNTS:
+            index = CorpusIndex(vectors, texts, sources, search_threads=threads)
+            expected = index.search(queries[0], TOP_K)[0] if baseline is None else baseline[1]
+            if not np.array_equal(index.search(queries[0], TOP_K)[0], expected):
+                print(f"❌ {n:>9} vectors, {threads:2} threads: top-k differs from single-threaded")
+            latency = median_ms(index, queries)
+            if baseline is None:
+                baseline = (latency, expected)
+            print(f"{n:>9} vectors  {threads:2} threads  median={latency:8.2f}ms  "
+                  f"speedup={baseline[0] / latency:5.2f}x")
+            del index
+        del vectors
+        print("-" * 80)
+
+
+if __name__ == "__main__":
+    main()
@@ -34,7 +34,8 @@ def generate_embeddings(openai_client: OpenAI, chunks: List[Dict]) -> List[Dict]
         embeddings.append({
             "embedding": vec,
             "text": chunk.get("content", ""),
-            "source": chunk.get("source", "")
+            "source": chunk.get("source", ""),
+            "sources": chunk.get("sources")
         })
         if (i + 1) % 50 == 0:
             print(f"Generated embeddings for {i+1} chunks")
@@ -42,13 +43,34 @@ def generate_embeddings(openai_client: OpenAI, chunks: List[Dict]) -> List[Dict]
     return embeddings
 
 
+def is_missing_sources_column(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    message = getattr(error, "message", None) or str(error)
+    return code in ("PGRST204", "42703") and "sources" in message
+
+
 def insert_into_supabase(supabase: Client, embeddings: List[Dict]):
+    # Cleared when the table has no `sources` column (migration not applied)
+    send_sources = True
     for i, e in enumerate(embeddings):
-        supabase.table("embeddings").insert({
+        row = {
             "source": e["source"],
             "content": e["text"],
             "embedding": e["embedding"]
-        }).execute()
+        }
+        # Set by dedupe_chunks.py on chunks merged from several sources
+        if send_sources and e.get("sources") and len(e["sources"]) > 1:
+            row["sources"] = e["sources"]
+        try:
+            supabase.table("embeddings").insert(row).execute()
+        except Exception as error:
+            if "sources" not in row or not is_missing_sources_column(error):
+                raise
+            print("⚠️  embeddings.sources is missing (see supabase/migrations); "
+                  "uploading without it, merged chunks keep only their primary source")
+            send_sources = False
+            del row["sources"]
+            supabase.table("embeddings").insert(row).execute()
         if (i + 1) % 50 == 0:
             print(f"Inserted {i+1} embeddings into Supabase")
 
@@ -0,0 +1,313 @@
+"""
+Source-partitioned embedding index with metadata pre-filtering
+"""
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import mmap
+import os
+import sys
+
+import numpy as np
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+# Metadata fields a chunk can be partitioned (and filtered) by
+METADATA_FIELDS = ('source', 'faculty', 'doc_type', 'academic_year')
+
+# Below this many candidate rows, thread hand-off costs more than it saves
+SHARD_MIN_ROWS = 20000
+
+
+def coordinate_blas_threads(search_threads):
+    """
+    Give each search thread a single-threaded BLAS so search_threads x BLAS
+    threads never oversubscribes the cores.
+    """
+    if search_threads <= 1:
+        return
+    if threadpool_limits is not None:
+        threadpool_limits(limits=1, user_api='blas')
+    elif not any(os.getenv(var) for var in ('OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'OMP_NUM_THREADS')):
+        print(
+            "Warning: threadpoolctl is not installed; set OPENBLAS_NUM_THREADS=1 "
+            "(or MKL_NUM_THREADS/OMP_NUM_THREADS) to avoid oversubscribing cores"
+        )
+
+
+def _top_k(scores, k):
+    """Positions of the k highest scores, best first"""
+    k = min(k, len(scores))
+    best = np.argpartition(scores, -k)[-k:]
+    return best[np.argsort(scores[best])[::-1]]
+
+
+def _score_shard(matrix, query, k, start, stop, rows):
+    # The matrix-vector product runs in BLAS with the GIL released
+    block = matrix[start:stop] if rows is None else matrix[rows[start:stop]]
+    scores = block @ query
+    best = _top_k(scores, k)
+    return best + start, scores[best]
+
+
+def sharded_top_k(matrix, query, k, executor, shards, rows=None):
+    """
+    Exact top-k over `matrix` (or over `rows` of it) split into row shards
+    scored in parallel. Returns (positions, scores), best first; positions
+    index `rows` when given, else the matrix.
+    """
+    n = len(matrix) if rows is None else len(rows)
+    bounds = np.linspace(0, n, shards + 1, dtype=np.int64)
+    futures = [
+        executor.submit(_score_shard, matrix, query, k, start, stop, rows)
+        for start, stop in zip(bounds[:-1], bounds[1:])
+        if stop > start
+    ]
+    # Merge the per-shard top-k lists
+    merged = heapq.nlargest(
+        k,
+        (
+            (score, position)
+            for future in futures
+            for position, score in zip(*future.result())
+        )
+    )
+    positions = np.array([position for _, position in merged], dtype=np.int64)
+    scores = np.array([score for score, _ in merged], dtype=matrix.dtype)
+    return positions, scores
+
+
+class ChunkStore:
+    """
+    Compact chunk text and source storage. Sources are interned into a small
+    table referenced by integer codes; texts live in one contiguous UTF-8
+    buffer (optionally written to `mmap_path` and memory-mapped) with an
+    offset array, and only the chunks actually read are decoded.
+    """
+
+    def __init__(self, texts, sources, mmap_path=None):
+        self.source_table = []
+        source_codes = {}
+        codes = []
+        for source in sources:
+            if source not in source_codes:
+                source_codes[source] = len(self.source_table)
+                self.source_table.append(source)
+            codes.append(source_codes[source])
+        self.source_codes = np.array(codes, dtype=np.uint32)
+
+        encoded = [text.encode('utf-8') for text in texts]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(
+            np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded)),
+            out=self.offsets[1:]
+        )
+        buffer = b''.join(encoded)
+        del encoded
+
+        self._file = None
+        if mmap_path and buffer:
+            # Replace atomically: a previous index may still map the old file
+            with open(mmap_path + '.tmp', 'wb') as f:
+                f.write(buffer)
+            os.replace(mmap_path + '.tmp', mmap_path)
+            self._file = open(mmap_path, 'rb')
+            self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.buffer = buffer
+
+    def __len__(self):
+        return len(self.source_codes)
+
+    def text(self, row):
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self.buffer[start:end].decode('utf-8')
+
+    def source(self, row):
+        return self.source_table[self.source_codes[row]]
+
+    def resident_bytes(self):
+        """Approximate resident memory of the store"""
+        buffer_bytes = 0 if isinstance(self.buffer, mmap.mmap) else len(self.buffer)
+        return (
+            buffer_bytes
+            + self.offsets.nbytes
+            + self.source_codes.nbytes
+            + sum(sys.getsizeof(source) for source in self.source_table)
+        )
+
+
+def list_storage_bytes(texts, sources):
+    """Resident memory of texts/sources kept as Python lists of str"""
+    return (
+        sys.getsizeof(texts) + sum(sys.getsizeof(text) for text in texts)
+        + sys.getsizeof(sources) + sum(sys.getsizeof(source) for source in sources)
+    )
+
+
+class CorpusIndex:
+    """
+    Holds the chunk vectors together with an inverted index from
+    (metadata field, value) to row numbers, so a search can be restricted
+    to a few partitions instead of scoring the whole corpus.
+    """
+
+    def __init__(self, vectors, texts, sources, metadata=None, mmap_path=None,
+                 search_threads=1):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.chunks = ChunkStore(texts, sources, mmap_path)
+
+        # Pre-normalize once so a search is a single matrix-vector product;
+        # only the normalized (float32, C-contiguous) matrix is kept
+        if len(vectors):
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.normalized = np.ascontiguousarray(vectors / norms)
+        else:
+            self.normalized = vectors
+
+        # Exact multi-core search: row shards scored on a thread pool
+        self.search_threads = max(1, search_threads)
+        self._executor = None
+        if self.search_threads > 1:
+            coordinate_blas_threads(self.search_threads)
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.search_threads,
+                thread_name_prefix='search'
+            )
+
+        if metadata is None:
+            metadata = [{'source': source} for source in sources]
+
+        # field -> value -> array of row numbers
+        self.partitions = {field: {} for field in METADATA_FIELDS}
+        for row, meta in enumerate(metadata):
+            for field in METADATA_FIELDS:
+                values = meta.get(field)
+                # Deduplicated chunks belong to every partition they came from
+                if isinstance(values, str):
+                    values = [values]
+                for value in values or []:
+                    self.partitions[field].setdefault(value, []).append(row)
+        for field in self.partitions:
+            for value, rows in self.partitions[field].items():
+                self.partitions[field][value] = np.array(rows, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.normalized)
+
+    def text(self, row):
+        return self.chunks.text(row)
+
+    def source(self, row):
+        return self.chunks.source(row)
+
+    def partition_sizes(self):
+        """Number of chunks per partition value, for every metadata field"""
+        return {
+            field: {value: len(rows) for value, rows in values.items()}
+            for field, values in self.partitions.items()
+        }
+
+    def candidate_rows(self, filters):
+        """
+        Resolve a filter such as {'doc_type': ['burse'], 'faculty': 'fse'}
+        into the row numbers to scan. Values of one field are OR-ed, fields
+        are AND-ed. Returns None when no filter applies (scan everything).
+        """
+        if not filters:
+            return None
+
+        rows = None
+        for field, values in filters.items():
+            if isinstance(values, str):
+                values = [values]
+            field_rows = [
+                self.partitions[field][value]
+                for value in values
+                if value in self.partitions[field]
+            ]
+            field_rows = (
+                np.unique(np.concatenate(field_rows))
+                if field_rows else np.array([], dtype=np.int64)
+            )
+            rows = field_rows if rows is None else np.intersect1d(rows, field_rows)
+        return rows
+
+    def score(self, query_vector, rows):
+        """Cosine similarity of the query to the given rows"""
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        return self.normalized[np.asarray(rows, dtype=np.int64)] @ query
+
+    def search(self, query_vector, top_k, filters=None):
+        """
+        Cosine-similarity search restricted to the partitions selected by
+        `filters`. Returns (row numbers, similarities), best match first.
+        """
+        rows = self.candidate_rows(filters)
+        if rows is not None and len(rows) == 0:
+            return np.array([], dtype=np.int64), np.array([])
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        candidates = len(self.normalized) if rows is None else len(rows)
+        if candidates == 0:
+            return np.array([], dtype=np.int64), np.array([])
+
+        if self._executor is not None and candidates >= SHARD_MIN_ROWS:
+            best, best_scores = sharded_top_k(
+                self.normalized, query, top_k, self._executor, self.search_threads, rows
+            )
+        else:
+            matrix = self.normalized if rows is None else self.normalized[rows]
+            scores = matrix @ query
+            best = _top_k(scores, top_k)
+            best_scores = scores[best]
+
+        indices = best if rows is None else rows[best]
+        return indices, best_scores
+
+
+def build_chunk_metadata(rows, source_metadata, default_metadata=None):
+    """
+    Attach partition metadata to every chunk row. A deduplicated chunk lists
+    all of its `sources` and takes the metadata of each. Columns stored on
+    the row itself win over the per-source configuration in url_mappings.json.
+    """
+    default_metadata = default_metadata or {}
+    metadata = []
+    for row in rows:
+        sources = row.get('sources') or [row.get('source', '')]
+        meta = {'source': list(dict.fromkeys(sources))}
+        for field in METADATA_FIELDS[1:]:
+            values = [
+                {**default_metadata, **source_metadata.get(source, {})}.get(field)
+                for source in sources
+            ]
+            values = list(dict.fromkeys(value for value in values if value))
+            if values:
+                meta[field] = values
+        for field in METADATA_FIELDS[1:]:
+            if row.get(field):
+                meta[field] = row[field]
+        metadata.append(meta)
+    return metadata
+
+
+def route_partitions(preprocessed_query, doc_type_keywords):
+    """
+    Lightweight router: pick the document types whose keywords appear in the
+    (abbreviation-expanded) query. Returns a filter dict, or {} to scan the
+    whole corpus when nothing matches.
+    """
+    query_lower = preprocessed_query.lower()
+    doc_types = [
+        doc_type
+        for doc_type, keywords in doc_type_keywords.items()
+        if any(keyword in query_lower for keyword in keywords)
+    ]
+    return {'doc_type': doc_types} if doc_types else {}
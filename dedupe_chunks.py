@@ -0,0 +1,159 @@
+"""
+Index-time near-duplicate chunk elimination
+Runs between split_into_chunks.py and connect_embeddings.py: collapses exact
+and near-duplicate chunks (MinHash over word shingles, LSH banding, verified
+by Jaccard similarity) into one canonical chunk that lists all its sources.
+
+Usage:
+    python dedupe_chunks.py [input.json] [output.json]
+Both default to data/chunks.json.
+"""
+import hashlib
+import json
+import random
+import re
+import sys
+
+SHINGLE_SIZE = 5          # words per shingle
+NUM_PERMUTATIONS = 128
+BANDS = 32                # 32 bands x 4 rows: candidates from ~0.4 Jaccard
+JACCARD_THRESHOLD = 0.85  # verified similarity needed to merge two chunks
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(42)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def normalize_text(text):
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def shingles(text):
+    words = normalize_text(text).split(" ")
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _hash(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash(shingle_set):
+    hashes = [_hash(s) for s in shingle_set]
+    return [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        self.parent[self.find(i)] = self.find(j)
+
+
+def dedupe(chunks, threshold=JACCARD_THRESHOLD):
+    """
+    Returns (canonical chunks, stats). Each canonical chunk keeps the longest
+    variant's content and `source`; chunks merged from several sources also
+    get `sources`, every source they came from.
+    """
+    n = len(chunks)
+    groups = _UnionFind(n)
+    stats = {"input_chunks": n, "exact_duplicates": 0, "near_duplicates": 0}
+
+    # Exact duplicates (after whitespace/case normalization)
+    first_by_hash = {}
+    for i, chunk in enumerate(chunks):
+        digest = hashlib.sha1(normalize_text(chunk["content"]).encode("utf-8")).hexdigest()
+        if digest in first_by_hash:
+            groups.union(i, first_by_hash[digest])
+            stats["exact_duplicates"] += 1
+        else:
+            first_by_hash[digest] = i
+
+    # Near duplicates among the remaining representatives
+    representatives = sorted(set(first_by_hash.values()))
+    shingle_sets = {i: shingles(chunks[i]["content"]) for i in representatives}
+    rows = NUM_PERMUTATIONS // BANDS
+    buckets = {}
+    for i in representatives:
+        signature = minhash(shingle_sets[i])
+        for band in range(BANDS):
+            key = (band, tuple(signature[band * rows:(band + 1) * rows]))
+            buckets.setdefault(key, []).append(i)
+
+    checked = set()
+    for members in buckets.values():
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                i, j = members[x], members[y]
+                if (i, j) in checked or groups.find(i) == groups.find(j):
+                    continue
+                checked.add((i, j))
+                if jaccard(shingle_sets[i], shingle_sets[j]) >= threshold:
+                    groups.union(i, j)
+                    stats["near_duplicates"] += 1
+
+    # One canonical chunk per group, in original order
+    clusters = {}
+    for i in range(n):
+        clusters.setdefault(groups.find(i), []).append(i)
+
+    canonical = []
+    for members in sorted(clusters.values(), key=lambda m: m[0]):
+        best = max(members, key=lambda i: len(chunks[i]["content"]))
+        sources = list(dict.fromkeys(
+            source
+            for i in members
+            for source in chunks[i].get("sources", [chunks[i]["source"]])
+        ))
+        chunk = {
+            "source": chunks[best]["source"],
+            "content": chunks[best]["content"]
+        }
+        if len(sources) > 1:
+            chunk["sources"] = sources
+        canonical.append(chunk)
+
+    stats["output_chunks"] = len(canonical)
+    return canonical, stats
+
+
+def main():
+    input_path = sys.argv[1] if len(sys.argv) > 1 else "data/chunks.json"
+    output_path = sys.argv[2] if len(sys.argv) > 2 else input_path
+
+    with open(input_path, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+
+    canonical, stats = dedupe(chunks)
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(canonical, f, ensure_ascii=False, indent=2)
+
+    removed = stats["input_chunks"] - stats["output_chunks"]
+    print(f"✅ Deduplicated {stats['input_chunks']} → {stats['output_chunks']} chunks "
+          f"({stats['exact_duplicates']} exact, {stats['near_duplicates']} near-duplicate merges, "
+          f"{removed} fewer embeddings)")
+    print(f"✅ Saved canonical chunks to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
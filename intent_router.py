@@ -0,0 +1,137 @@
+"""
+Deterministic intent router: answers high-confidence, fixed-answer intents
+(timetable, academic calendar, ...) locally without an embedding or LLM call
+"""
+import re
+import threading
+import time
+
+# Words that mark a message as English; anything else is answered in Romanian
+ENGLISH_MARKERS = {
+    'the', 'what', 'where', 'when', 'how', 'is', 'are', 'can', 'i', 'my',
+    'find', 'see', 'timetable', 'schedule', 'year', 'class', 'classes',
+    'please', 'show', 'link'
+}
+ROMANIAN_MARKERS = {
+    'care', 'unde', 'când', 'cand', 'este', 'sunt', 'găsesc', 'gasesc',
+    'vreau', 'pot', 'și', 'si', 'anului', 'universitar', 'orarul',
+    'calendarul'
+}
+
+TOKEN_PATTERN = re.compile(r"[\w\-]+", re.UNICODE)
+
+
+def detect_language(message):
+    """Cheap Romanian/English guess from marker words and diacritics"""
+    tokens = TOKEN_PATTERN.findall(message.lower())
+    if any(ch in message.lower() for ch in 'ăâîșşțţ'):
+        return 'ro'
+    english = sum(1 for token in tokens if token in ENGLISH_MARKERS)
+    romanian = sum(1 for token in tokens if token in ROMANIAN_MARKERS)
+    return 'en' if english > romanian else 'ro'
+
+
+def word_prefix_pattern(terms):
+    """
+    Matches any of `terms` at the start of a word, so "orar" finds "orarul"
+    but not "temporar" or "onorariu". Returns None for no terms.
+    """
+    if not terms:
+        return None
+    alternatives = '|'.join(re.escape(term.lower()) for term in terms)
+    return re.compile(r"(?<!\w)(?:" + alternatives + ")", re.UNICODE)
+
+
+class IntentRouter:
+    """
+    Matches a message against configured intents. An intent fires only when
+    the message is short, has a word starting with one of its triggers (after
+    expanding the abbreviations used by preprocess_query), has no word
+    starting with one of its exclusions and no other intent also matches.
+    """
+
+    def __init__(self, intents, abbreviations, max_words=8):
+        self.intents = intents
+        self.abbreviations = abbreviations
+        self.max_words = max_words
+        self._abbreviation_patterns = [
+            (word_prefix_pattern([abbrev]), expansion.lower())
+            for abbrev, expansion in abbreviations.items()
+        ]
+        self._patterns = {
+            name: (
+                word_prefix_pattern(intent['triggers']),
+                word_prefix_pattern(intent.get('exclude', []))
+            )
+            for name, intent in intents.items()
+        }
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.hits = {name: 0 for name in intents}
+        self.total_match_seconds = 0.0
+
+    def _expand(self, message_lower):
+        terms = [message_lower]
+        for pattern, expansion in self._abbreviation_patterns:
+            if pattern.search(message_lower):
+                terms.append(expansion)
+        return ' '.join(terms)
+
+    def _matched_intent(self, message):
+        """Name of the single intent the message matches, or None"""
+        message_lower = message.lower()
+        if len(message_lower.split()) > self.max_words:
+            return None
+        expanded = self._expand(message_lower)
+        matched = [
+            name for name, (triggers, exclude) in self._patterns.items()
+            if triggers.search(expanded)
+            and not (exclude and exclude.search(expanded))
+        ]
+        # Ambiguous messages go to retrieval
+        return matched[0] if len(matched) == 1 else None
+
+    def would_match(self, message):
+        """Whether match() would answer the message, without touching the stats"""
+        return self._matched_intent(message) is not None
+
+    def match(self, message):
+        """
+        Return {'intent', 'response', 'url', 'language'} for a confident
+        match, or None to hand the message to the normal RAG path.
+        """
+        start = time.perf_counter()
+        result = None
+
+        name = self._matched_intent(message)
+        if name is not None:
+            intent = self.intents[name]
+            language = detect_language(message)
+            responses = intent['responses']
+            result = {
+                'intent': name,
+                'response': responses.get(language, responses['ro']),
+                'url': intent.get('url'),
+                'language': language
+            }
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.checks += 1
+            self.total_match_seconds += elapsed
+            if result is not None:
+                self.hits[result['intent']] += 1
+        return result
+
+    def stats(self):
+        with self._lock:
+            total_hits = sum(self.hits.values())
+            return {
+                'checks': self.checks,
+                'hits': dict(self.hits),
+                'hit_rate': total_hits / self.checks if self.checks else 0.0,
+                'avg_match_ms': (
+                    self.total_match_seconds / self.checks * 1000
+                    if self.checks else 0.0
+                )
+            }
@@ -0,0 +1,80 @@
+"""
+Model cascade: route confident, short-answer questions to a faster model and
+keep gpt-4o for low-confidence or multi-chunk synthesis
+"""
+import os
+import threading
+
+# Phrasings that ask for synthesis across several passages
+SYNTHESIS_MARKERS = (
+    'compar', 'diferen', 'toate', 'toţi', 'toți', 'explic', 'de ce',
+    'avantaj', 'pași', 'pasi', 'procedur', 'difference', 'compare', 'explain',
+    'why', 'all ', 'list', 'steps'
+)
+
+
+class CascadePolicy:
+    def __init__(self, fast_model="gpt-4o-mini", strong_model="gpt-4o",
+                 fast_min_similarity=0.65, fast_min_margin=0.05,
+                 fast_max_words=12, enabled=True):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.fast_min_similarity = fast_min_similarity
+        self.fast_min_margin = fast_min_margin
+        self.fast_max_words = fast_max_words
+        self.enabled = enabled
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            fast_model=os.getenv("CASCADE_FAST_MODEL", "gpt-4o-mini"),
+            strong_model=os.getenv("CASCADE_STRONG_MODEL", "gpt-4o"),
+            fast_min_similarity=float(os.getenv("CASCADE_FAST_MIN_SIMILARITY", "0.65")),
+            fast_min_margin=float(os.getenv("CASCADE_FAST_MIN_MARGIN", "0.05")),
+            fast_max_words=int(os.getenv("CASCADE_FAST_MAX_WORDS", "12")),
+            enabled=os.getenv("CASCADE_ENABLED", "true").lower() == "true"
+        )
+
+    def choose(self, message, relevant_scores):
+        """
+        Pick a tier from the question and the similarity scores of the chunks
+        that passed the threshold (best first). Returns (tier, model, reason).
+        """
+        if not self.enabled:
+            return 'strong', self.strong_model, 'cascade disabled'
+        if not relevant_scores or relevant_scores[0] < self.fast_min_similarity:
+            return 'strong', self.strong_model, 'low retrieval confidence'
+
+        message_lower = message.lower()
+        if len(message_lower.split()) > self.fast_max_words:
+            return 'strong', self.strong_model, 'long question'
+        if any(marker in message_lower for marker in SYNTHESIS_MARKERS):
+            return 'strong', self.strong_model, 'synthesis requested'
+
+        # The answer should live in one chunk: the best match must clearly lead
+        if len(relevant_scores) > 1 and (
+            relevant_scores[0] - relevant_scores[1] < self.fast_min_margin
+        ):
+            return 'strong', self.strong_model, 'multi-chunk synthesis'
+
+        return 'fast', self.fast_model, 'confident single-chunk answer'
+
+
+class CascadeStats:
+    """Per-tier counts, kept in-process for /api/health"""
+
+    def __init__(self):
+        self.counts = {'fast': 0, 'strong': 0}
+        self._lock = threading.Lock()
+
+    def record(self, tier):
+        with self._lock:
+            self.counts[tier] = self.counts.get(tier, 0) + 1
+
+    def as_dict(self):
+        with self._lock:
+            total = sum(self.counts.values())
+            return {
+                'counts': dict(self.counts),
+                'fast_share': self.counts.get('fast', 0) / total if total else 0.0
+            }
@@ -0,0 +1,172 @@
+"""
+Cache pre-warming from the messages log
+Mines the most frequent and most recent questions from the Supabase
+`messages` table (or a local JSON export of it), batch-embeds them and fills
+the query-embedding and answer caches before traffic arrives.
+
+Run standalone to produce the hot-query report without touching any cache:
+    python prewarm_caches.py [path/to/messages_export.json]
+"""
+from collections import Counter
+from datetime import datetime, timezone
+import json
+import os
+import sys
+
+from query_cache import normalize_query
+
+MESSAGE_COLUMNS = "user_message, assistant_message, retrieved_source, created_at"
+
+
+def load_message_rows(supabase=None, export_path=None, limit=5000):
+    """Most recent logged messages, from a local export if given, else Supabase"""
+    if export_path:
+        with open(export_path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        rows.sort(key=lambda row: row.get("created_at") or "", reverse=True)
+        return rows[:limit]
+    return (
+        supabase.table("messages")
+        .select(MESSAGE_COLUMNS)
+        .order("created_at", desc=True)
+        .limit(limit)
+        .execute()
+        .data
+    )
+
+
+def _age_days(created_at, now):
+    if not created_at:
+        return None
+    try:
+        when = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (now - when).total_seconds() / 86400)
+
+
+def mine_hot_queries(rows, limit=200, half_life_days=14.0):
+    """
+    Rank distinct (normalized) questions by frequency with exponential
+    recency decay, so both popular and currently trending questions rank high.
+    """
+    now = datetime.now(timezone.utc)
+    counts = Counter()
+    scores = Counter()
+    examples = {}
+    for row in rows:
+        question = (row.get("user_message") or "").strip()
+        if not question:
+            continue
+        key = normalize_query(question)
+        counts[key] += 1
+        examples.setdefault(key, question)
+        age = _age_days(row.get("created_at"), now)
+        scores[key] += 1.0 if age is None else 0.5 ** (age / half_life_days)
+
+    ranked = sorted(scores, key=lambda key: (scores[key], counts[key]), reverse=True)
+    return [
+        {
+            "query": examples[key],
+            "normalized": key,
+            "count": counts[key],
+            "score": round(scores[key], 3)
+        }
+        for key in ranked[:limit]
+    ]
+
+
+def build_report(hot_queries, total_messages, answered, stopped_early=False):
+    """Hot queries plus the hit rate the warmed caches would have had on the log"""
+    embedded_hits = sum(q["count"] for q in hot_queries)
+    answered_hits = sum(q["count"] for q in hot_queries if q["normalized"] in answered)
+    return {
+        "messages_analyzed": total_messages,
+        "distinct_hot_queries": len(hot_queries),
+        "projected_embedding_hit_rate": embedded_hits / total_messages if total_messages else 0.0,
+        "projected_answer_hit_rate": answered_hits / total_messages if total_messages else 0.0,
+        "stopped_early": stopped_early,
+        "hot_queries": hot_queries
+    }
+
+
+def prewarm(rows, preprocess, embed_batch, embedding_cache, answer_fn=None,
+            answer_cache=None, answer_key=None, skip=None, query_limit=200,
+            answer_limit=25, batch_size=100, deadline=None, on_embedded=None):
+    """
+    Fill the caches from logged traffic and return a report.
+
+    `embed_batch(texts)` returns one vector per text; `answer_fn(query)`
+    returns a cacheable answer or None; `answer_key(query)` is the cache key
+    the server uses for that answer; `skip(query)` filters out questions that
+    never reach retrieval (e.g. local intent answers). Work stops once
+    `deadline.remaining()` runs out; `on_embedded()` is called when the
+    embedding pass is over, before the (slower) answer pass.
+    """
+    def out_of_time():
+        return deadline is not None and deadline.remaining() <= 0
+
+    hot_queries = mine_hot_queries(rows, limit=query_limit)
+    if skip is not None:
+        hot_queries = [q for q in hot_queries if not skip(q["query"])]
+
+    # Batch-embed the preprocessed form, which is what chat() embeds, under
+    # the normalized question the server looks embeddings up by
+    pending = [q for q in hot_queries if q["normalized"] not in embedding_cache]
+    stopped_early = False
+    for start in range(0, len(pending), batch_size):
+        if out_of_time():
+            stopped_early = True
+            break
+        batch = pending[start:start + batch_size]
+        texts = [preprocess(q["query"]) for q in batch]
+        for q, vector in zip(batch, embed_batch(texts)):
+            embedding_cache.put(q["normalized"], vector)
+
+    if on_embedded is not None:
+        on_embedded()
+
+    answered = set()
+    if answer_fn is not None and answer_cache is not None:
+        for q in hot_queries[:answer_limit]:
+            if out_of_time():
+                stopped_early = True
+                break
+            result = answer_fn(q["query"])
+            if result is not None:
+                answer_cache.put(answer_key(q["query"]), result)
+                answered.add(q["normalized"])
+
+    return build_report(hot_queries, len(rows), answered, stopped_early)
+
+
+def write_report(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    export_path = sys.argv[1] if len(sys.argv) > 1 else os.getenv("PREWARM_EXPORT_PATH")
+    supabase = None
+    if not export_path:
+        from dotenv import load_dotenv
+        from supabase import create_client
+        load_dotenv()
+        supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+
+    rows = load_message_rows(supabase, export_path)
+    report = build_report(mine_hot_queries(rows), len(rows), answered=set())
+    report_path = os.getenv("PREWARM_REPORT_PATH", "prewarm_report.json")
+    write_report(report, report_path)
+
+    print(f"Analyzed {report['messages_analyzed']} messages")
+    print(f"Projected embedding cache hit rate: {report['projected_embedding_hit_rate']:.0%}")
+    for q in report["hot_queries"][:20]:
+        print(f"{q['count']:5}  {q['query'][:70]}")
+    print(f"Report written to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Prompt assembly with a byte-identical static prefix (so provider-side prompt
+caching applies) and a per-request input token budget
+"""
+from functools import cached_property
+import threading
+
+# Rough characters-per-token ratio used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """
+    The gpt-4o / gpt-4o-mini tokenizer, loaded on first use: tiktoken may
+    download its BPE file, which must not happen at import. None when it is
+    not installed or cannot be loaded.
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    print(f"tiktoken unavailable, estimating tokens from characters: {e}")
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text, max_tokens):
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens * CHARS_PER_TOKEN]
+
+
+class PromptTooLarge(ValueError):
+    """Even the minimal prompt (no context, no previous turn) exceeds the budget"""
+
+
+class PromptBuilder:
+    """
+    Builds chat messages as [static system prefix, volatile user suffix].
+    The system message never changes between requests; everything that does
+    (retrieved chunks, previous turn, question) goes after it.
+    """
+
+    CHUNK_SEPARATOR = "\n\n---\n\n"
+    # Context always left room for next to the longest accepted question
+    MIN_CONTEXT_TOKENS = 256
+
+    def __init__(self, system_prompt, standing_instructions, input_token_budget):
+        self.static_prefix = f"{system_prompt}\n\n{standing_instructions}"
+        self.input_token_budget = input_token_budget
+
+    @cached_property
+    def static_tokens(self):
+        # Counted on first use so building the prompt does not load tiktoken
+        return count_tokens(self.static_prefix)
+
+    @cached_property
+    def max_question_tokens(self):
+        """Longest question that still leaves MIN_CONTEXT_TOKENS of context"""
+        template_tokens = count_tokens(self._user_prompt([""], [""], [""], "", ""))
+        return max(
+            0,
+            self.input_token_budget - self.static_tokens - template_tokens - self.MIN_CONTEXT_TOKENS
+        )
+
+    def question_fits(self, question):
+        return count_tokens(question) <= self.max_question_tokens
+
+    def build(self, chunks, sources, urls, question, previous_turn=""):
+        """
+        Assemble the messages for one request, dropping the least relevant
+        chunks (and finally truncating) until the input fits the budget.
+        `chunks`, `sources` and `urls` are parallel lists, best match first.
+        Returns (messages, chunks_kept, token_stats); raises PromptTooLarge
+        when the question alone does not fit (see question_fits).
+        """
+        dynamic_budget = self.input_token_budget - self.static_tokens
+        kept = len(chunks)
+        user_prompt = self._user_prompt(chunks, sources, urls, question, previous_turn)
+        dynamic_tokens = count_tokens(user_prompt)
+
+        while dynamic_tokens > dynamic_budget and kept > 1:
+            kept -= 1
+            user_prompt = self._user_prompt(
+                chunks[:kept], sources[:kept], urls[:kept], question, previous_turn
+            )
+            dynamic_tokens = count_tokens(user_prompt)
+
+        if dynamic_tokens > dynamic_budget and previous_turn:
+            previous_turn = ""
+            user_prompt = self._user_prompt(
+                chunks[:kept], sources[:kept], urls[:kept], question, previous_turn
+            )
+            dynamic_tokens = count_tokens(user_prompt)
+
+        first_chunk = chunks[0]
+        while dynamic_tokens > dynamic_budget and first_chunk:
+            # Token boundaries can shift at the cut, so re-measure and repeat
+            overflow = dynamic_tokens - dynamic_budget
+            first_chunk = truncate_to_tokens(first_chunk, count_tokens(first_chunk) - overflow)
+            user_prompt = self._user_prompt(
+                [first_chunk], sources[:1], urls[:1], question, previous_turn
+            )
+            dynamic_tokens = count_tokens(user_prompt)
+
+        if dynamic_tokens > dynamic_budget:
+            raise PromptTooLarge(
+                f"prompt needs {dynamic_tokens} tokens with no context, budget is {dynamic_budget}"
+            )
+
+        messages = [
+            {"role": "system", "content": self.static_prefix},
+            {"role": "user", "content": user_prompt}
+        ]
+        token_stats = {
+            'static': self.static_tokens,
+            'dynamic': dynamic_tokens,
+            'budget': self.input_token_budget,
+            'chunks_dropped': len(chunks) - kept
+        }
+        return messages, kept, token_stats
+
+    def _user_prompt(self, chunks, sources, urls, question, previous_turn):
+        combined_context = self.CHUNK_SEPARATOR.join(chunks)
+        related_urls = ', '.join(dict.fromkeys(urls))
+        return f"""RETRIEVED CONTEXT (Top {len(chunks)} most relevant chunks):
+
+{combined_context}
+
+PRIMARY SOURCE: {sources[0]}
+RELATED URLS: {related_urls}
+
+{previous_turn}USER QUESTION:
+{question}"""
@@ -0,0 +1,69 @@
+"""
+Bounded in-process caches for query embeddings and generated answers
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+def normalize_query(message):
+    """Normalize a question so trivially different spellings share cache entries"""
+    return ' '.join(message.lower().split()).rstrip(' ?!.')
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a size cap and an optional TTL"""
+
+    def __init__(self, max_entries=1000, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and (
+                time.monotonic() - entry[1] > self.ttl_seconds
+            ):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def __contains__(self, key):
+        """Membership test that does not touch hit/miss counters or recency"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (
+                self.ttl_seconds is None
+                or time.monotonic() - entry[1] <= self.ttl_seconds
+            )
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -18,6 +18,17 @@ fi
 echo "✅ Chunks created successfully"
 echo ""
 
+# Step 1b: Collapse exact and near-duplicate chunks
+echo "🧹 Removing duplicate chunks..."
+python dedupe_chunks.py
+
+if [ $? -ne 0 ]; then
+    echo "❌ Error: Failed to deduplicate chunks"
+    exit 1
+fi
+
+echo ""
+
 # Step 2: Check if we should clear old embeddings
 echo "⚠️  Step 2/3: Clearing old embeddings from Supabase..."
 echo "Please manually clear the 'embeddings' table in Supabase dashboard, or run:"
@@ -27,7 +38,7 @@ read -p "Press Enter when ready to continue..."
 
 # Step 3: Generate and upload new embeddings
 echo "🔮 Step 3/3: Generating and uploading new embeddings..."
-python generate_embeddings.py
+python connect_embeddings.py
 
 if [ $? -ne 0 ]; then
     echo "❌ Error: Failed to generate embeddings"
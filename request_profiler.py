@@ -0,0 +1,178 @@
+"""
+On-demand request profiling for the serving path
+Profiling is armed for the next N requests (admin endpoint) or a single
+request (header) and writes, per request:
+  - deterministic mode: a cProfile/pstats `.prof` file (snakeviz, gprof2dot,
+    flameprof)
+  - sampling mode: collapsed stacks `.folded` (flamegraph.pl, speedscope)
+plus a `.json` sidecar with the per-stage timing breakdown.
+When nothing is armed, the only cost is one attribute check per request and
+one thread-local lookup per stage.
+"""
+from contextlib import nullcontext
+from datetime import datetime
+from functools import wraps
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+
+MODES = ('deterministic', 'sampling')
+
+_current = threading.local()
+_NULL_STAGE = nullcontext()
+
+
+class _Stage:
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        elapsed = (time.perf_counter() - self.started) * 1000
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + elapsed
+
+
+def stage(name):
+    """Time a block as one stage of the request being profiled (if any)"""
+    timings = getattr(_current, 'timings', None)
+    if timings is None:
+        return _NULL_STAGE
+    return _Stage(timings, name)
+
+
+class _Sampler(threading.Thread):
+    """Samples one thread's stack at a fixed interval into collapsed stacks"""
+
+    def __init__(self, target_thread_id, interval):
+        super().__init__(daemon=True)
+        self.target_thread_id = target_thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class RequestProfiler:
+    def __init__(self, output_dir, admin_token=None, sample_interval=0.005):
+        self.output_dir = output_dir
+        self.admin_token = admin_token
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self.remaining = 0
+        self.mode = 'deterministic'
+        # Checked on every request; True only while something is armed
+        self.armed = False
+
+    @property
+    def enabled(self):
+        return bool(self.admin_token)
+
+    def authorized(self, token):
+        return self.enabled and token == self.admin_token
+
+    def arm(self, count, mode='deterministic'):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of: {', '.join(MODES)}")
+        with self._lock:
+            self.remaining = max(0, int(count))
+            self.mode = mode
+            self.armed = self.remaining > 0
+
+    def _claim(self, header_mode, header_token):
+        """Decide whether this request is profiled, and how"""
+        if header_mode and self.authorized(header_token):
+            return header_mode if header_mode in MODES else 'deterministic'
+        if not self.armed:
+            return None
+        with self._lock:
+            if self.remaining <= 0:
+                return None
+            self.remaining -= 1
+            self.armed = self.remaining > 0
+            return self.mode
+
+    def wrap(self, view, label, header_source):
+        """
+        Decorate a view. `header_source()` returns (mode header, token header)
+        for the current request.
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.armed and not self.enabled:
+                return view(*args, **kwargs)
+            mode = self._claim(*header_source())
+            if mode is None:
+                return view(*args, **kwargs)
+            return self._profile(view, label, mode, args, kwargs)
+        return wrapper
+
+    def _profile(self, view, label, mode, args, kwargs):
+        _current.timings = timings = {}
+        started = time.perf_counter()
+        profiler = sampler = None
+        if mode == 'deterministic':
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is active (one at a time on Python 3.12+)
+                profiler = None
+        else:
+            sampler = _Sampler(threading.get_ident(), self.sample_interval)
+            sampler.start()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            total_ms = (time.perf_counter() - started) * 1000
+            if profiler is not None:
+                profiler.disable()
+            if sampler is not None:
+                sampler.stop()
+            _current.timings = None
+            self._write(label, mode, profiler, sampler, timings, total_ms)
+
+    def _write(self, label, mode, profiler, sampler, timings, total_ms):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            name = f"{label}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+            base = os.path.join(self.output_dir, name)
+            # Neither collector ran when cProfile could not be enabled: the
+            # stage timings are still worth keeping
+            if profiler is not None:
+                profiler.dump_stats(base + '.prof')
+            elif sampler is not None:
+                with open(base + '.folded', 'w', encoding='utf-8') as f:
+                    for stack, count in sampler.stacks.items():
+                        f.write(f"{stack} {count}\n")
+            with open(base + '.json', 'w', encoding='utf-8') as f:
+                json.dump({
+                    'mode': mode,
+                    'collected': profiler is not None or sampler is not None,
+                    'total_ms': round(total_ms, 3),
+                    'stages_ms': {k: round(v, 3) for k, v in timings.items()}
+                }, f, indent=2)
+            print(f"Profile written: {base}")
+        except Exception as e:
+            # Runs in the request's finally block: never fail the request
+            print(f"Error writing profile: {e}")
@@ -0,0 +1,124 @@
+"""
+Per-request deadlines, bounded retries and circuit breakers for outbound
+calls (OpenAI embeddings/completions, Supabase logging)
+"""
+import random
+import threading
+import time
+
+
+class Deadline:
+    """Time budget for one request, shared by all of its stages"""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class DependencyUnavailable(Exception):
+    """An outbound call gave up: breaker open, retries or budget exhausted"""
+
+    def __init__(self, dependency, cause=None):
+        super().__init__(f"{dependency} unavailable: {cause}")
+        self.dependency = dependency
+        self.cause = cause
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and fails fast for
+    `reset_timeout` seconds. Then a single trial call is let through
+    (half-open): success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.rejected = 0
+
+    def before_call(self):
+        with self._lock:
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name} circuit is open")
+                self.state = 'half_open'
+                self.trial_in_flight = False
+            if self.state == 'half_open':
+                if self.trial_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name} circuit is half-open")
+                self.trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.trial_in_flight = False
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'rejected': self.rejected
+            }
+
+
+def call_with_retries(fn, breaker, deadline, timeout_cap, retry_on=(Exception,),
+                      max_attempts=3, base_backoff=0.2, min_timeout=0.5):
+    """
+    Call `fn(timeout)` with a timeout bounded by both `timeout_cap` and the
+    request deadline. Errors in `retry_on` are retried with full-jitter
+    exponential backoff while budget remains; other errors propagate
+    unchanged. Raises DependencyUnavailable when giving up.
+    """
+    last_error = None
+    for attempt in range(max_attempts):
+        timeout = min(timeout_cap, deadline.remaining())
+        if timeout < min_timeout:
+            break
+        try:
+            breaker.before_call()
+        except CircuitOpenError as e:
+            raise DependencyUnavailable(breaker.name, e)
+
+        try:
+            result = fn(timeout)
+        except retry_on as e:
+            breaker.record_failure()
+            last_error = e
+            backoff = random.uniform(0, base_backoff * (2 ** attempt))
+            if deadline.remaining() - backoff < min_timeout:
+                break
+            time.sleep(backoff)
+            continue
+        except Exception:
+            # Not the dependency's fault (e.g. a bad request): no breaker hit
+            breaker.record_success()
+            raise
+
+        breaker.record_success()
+        return result
+
+    raise DependencyUnavailable(breaker.name, last_error or "deadline exhausted")
@@ -0,0 +1,118 @@
+"""
+Bounded per-session retrieval context, so short follow-up questions can
+reuse the previous turn instead of re-retrieving from scratch
+"""
+from collections import OrderedDict
+import threading
+import time
+
+import numpy as np
+
+
+class SessionStore:
+    """
+    LRU map of session_id -> last turn's retrieval context.
+
+    Entries expire after `ttl_seconds`, and the store never holds more than
+    `max_sessions` sessions: the least recently used one is evicted first.
+    """
+
+    def __init__(self, max_sessions=10000, ttl_seconds=1800, max_answer_chars=1500):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_answer_chars = max_answer_chars
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, session_id, index_version=None):
+        """
+        Return the live context for a session, or None. Context stored
+        against another index version is dropped: its chunk ids point into
+        a different corpus.
+        """
+        if not session_id:
+            return None
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry['updated_at'] > self.ttl_seconds:
+                del self._entries[session_id]
+                self.expirations += 1
+                return None
+            if index_version is not None and entry['index_version'] != index_version:
+                del self._entries[session_id]
+                return None
+            self._entries.move_to_end(session_id)
+            return entry
+
+    def put(self, session_id, query, query_vector, chunk_ids, scores, filters, answer,
+            index_version=None):
+        """Remember the retrieval context of the turn that was just answered"""
+        if not session_id:
+            return
+        entry = {
+            'query': query,
+            'query_vector': np.asarray(query_vector, dtype=np.float32),
+            'chunk_ids': [int(i) for i in chunk_ids],
+            'scores': [float(s) for s in scores],
+            'filters': filters,
+            'answer': (answer or '')[:self.max_answer_chars],
+            'index_version': index_version,
+            'updated_at': time.monotonic()
+        }
+        with self._lock:
+            self._entries[session_id] = entry
+            self._entries.move_to_end(session_id)
+            self._purge_expired()
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every session, e.g. after the index was rebuilt"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._entries),
+                'max_sessions': self.max_sessions,
+                'ttl_seconds': self.ttl_seconds,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def _purge_expired(self):
+        # Entries are kept in recency order, so stale ones sit at the front
+        now = time.monotonic()
+        while self._entries:
+            oldest_id, oldest = next(iter(self._entries.items()))
+            if now - oldest['updated_at'] <= self.ttl_seconds:
+                break
+            del self._entries[oldest_id]
+            self.expirations += 1
+
+
+def is_follow_up(message, context, doc_types, embed, max_words=6, min_similarity=0.4):
+    """
+    A short message is a follow-up to the session's previous question
+    ("și care e termenul?") only when it stays on the same topic: it routes
+    to the same document types, or, when it routes nowhere, its embedding
+    (`embed()`, None if unavailable) is close to the previous question's.
+    """
+    if context is None or len(message.split()) > max_words:
+        return False
+    previous_types = set((context['filters'] or {}).get('doc_type', []))
+    if doc_types:
+        return bool(previous_types) and set(doc_types) <= previous_types
+    query_vector = embed()
+    if query_vector is None:
+        return False
+    query_vector = np.asarray(query_vector, dtype=np.float32)
+    previous_vector = context['query_vector']
+    norms = np.linalg.norm(query_vector) * np.linalg.norm(previous_vector)
+    return bool(norms) and float(query_vector @ previous_vector) / norms >= min_similarity
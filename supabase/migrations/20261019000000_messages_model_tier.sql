@@ -0,0 +1,3 @@
+-- Generation tier ('fast' or 'strong') that answered each logged message,
+-- written by api_server.py (see model_cascade.py)
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS model_tier TEXT;
@@ -0,0 +1,3 @@
+-- Every source a deduplicated chunk was found in (dedupe_chunks.py); only
+-- set for chunks merged from more than one source
+ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS sources TEXT[];
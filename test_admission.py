@@ -0,0 +1,108 @@
+"""
+Tests for /api/chat admission control
+Run with: python -m pytest test_admission.py
+"""
+
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, SessionRateLimiter
+
+
+def hold_slots(controller, count):
+    """Occupy `count` slots from background threads until released"""
+    release = threading.Event()
+    entered = threading.Semaphore(0)
+
+    def holder():
+        with controller.slot():
+            entered.release()
+            release.wait(5)
+
+    threads = [threading.Thread(target=holder) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for _ in range(count):
+        entered.acquire(timeout=5)
+    return release, threads
+
+
+def test_queue_timeout_rejects_with_503():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+    release, threads = hold_slots(controller, 1)
+    try:
+        with pytest.raises(AdmissionRejected) as rejected:
+            with controller.slot():
+                pass
+        assert rejected.value.status_code == 503
+        assert controller.stats()["rejected_timeout"] == 1
+        assert controller.stats()["queued"] == 0
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+
+def test_full_queue_rejects_immediately():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5)
+    release, threads = hold_slots(controller, 1)
+
+    def queued_waiter():
+        with controller.slot():
+            pass
+
+    waiter = threading.Thread(target=queued_waiter)
+    try:
+        waiter.start()
+        while controller.stats()["queued"] < 1:
+            time.sleep(0.01)
+
+        started = time.monotonic()
+        with pytest.raises(AdmissionRejected) as rejected:
+            with controller.slot():
+                pass
+        assert time.monotonic() - started < 1
+        assert rejected.value.status_code == 503
+        assert controller.stats()["rejected_queue_full"] == 1
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        waiter.join(5)
+
+
+def test_queued_request_is_admitted_when_a_slot_frees():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5)
+    release, threads = hold_slots(controller, 1)
+    threading.Timer(0.05, release.set).start()
+    with controller.slot():
+        assert controller.stats()["in_flight"] == 1
+    for thread in threads:
+        thread.join(5)
+    assert controller.stats()["admitted"] == 2
+
+
+def test_slot_is_released_when_the_block_raises():
+    controller = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=0.05)
+    with pytest.raises(RuntimeError):
+        with controller.slot():
+            raise RuntimeError("handler failed")
+    assert controller.stats()["in_flight"] == 0
+    with controller.slot():
+        pass
+
+
+def test_session_rate_limit_returns_429():
+    controller = AdmissionController(rate_limiter=SessionRateLimiter(rate_per_minute=60, burst=2))
+    for _ in range(2):
+        with controller.slot("session-1"):
+            pass
+    with pytest.raises(AdmissionRejected) as rejected:
+        with controller.slot("session-1"):
+            pass
+    assert rejected.value.status_code == 429
+    assert rejected.value.retry_after >= 1
+    with controller.slot("session-2"):
+        pass
@@ -0,0 +1,74 @@
+"""
+Tests for the deterministic intent router
+Run with: python -m pytest test_intent_router.py
+"""
+
+import json
+
+import pytest
+
+from intent_router import IntentRouter, detect_language
+
+# Subset of api_server.ABBREVIATIONS that can reach the configured triggers
+ABBREVIATIONS = {
+    'fse': 'Facultatea de Științe Economice',
+    'orar': 'orar program cursuri',
+    'sesiune': 'sesiune examen',
+}
+
+
+@pytest.fixture(scope="module")
+def router():
+    with open("intents.json", "r", encoding="utf-8") as f:
+        config = json.load(f)
+    return IntentRouter(config["intents"], ABBREVIATIONS, max_words=config["max_words"])
+
+
+@pytest.mark.parametrize("message", [
+    "Unde gasesc orarul?",
+    "fse orar",
+    "Care e orarul anului 2?",
+    "Where can I see the timetable?",
+])
+def test_timetable_matches(router, message):
+    assert router.match(message)["intent"] == "timetable"
+
+
+@pytest.mark.parametrize("message", [
+    "Exista cazare temporara?",
+    "Am un contract temporar",
+    "onorariu coordonator licenta",
+    "ce e decorarea holului",
+])
+def test_trigger_inside_another_word_does_not_match(router, message):
+    assert router.match(message) is None
+
+
+@pytest.mark.parametrize("message", [
+    "orarul sesiunii de examene",
+    "orar biblioteca",
+])
+def test_exclusions_hand_off_to_retrieval(router, message):
+    assert router.match(message) is None
+
+
+def test_academic_calendar_matches(router):
+    result = router.match("Calendarul academic")
+    assert result["intent"] == "academic_calendar"
+    assert result["language"] == "ro"
+
+
+def test_long_messages_are_not_routed(router):
+    assert router.match("as vrea sa stiu unde pot gasi orarul pentru anul doi la master") is None
+
+
+def test_would_match_leaves_stats_untouched(router):
+    before = router.stats()
+    assert router.would_match("Unde gasesc orarul?")
+    assert not router.would_match("Exista cazare temporara?")
+    assert router.stats() == before
+
+
+def test_detect_language():
+    assert detect_language("Where can I find the timetable?") == "en"
+    assert detect_language("Unde găsesc orarul?") == "ro"
@@ -0,0 +1,107 @@
+"""
+Tests for deadlines, retries and circuit breakers
+Run with: python -m pytest test_resilience.py
+"""
+
+import time
+
+import pytest
+
+from resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    Deadline,
+    DependencyUnavailable,
+    call_with_retries
+)
+
+
+class Transient(Exception):
+    pass
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("dep", failure_threshold=3, reset_timeout=60)
+    open_breaker(breaker)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_half_open_allows_one_trial_then_closes():
+    breaker = CircuitBreaker("dep", failure_threshold=2, reset_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    # Only one trial call at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker("dep", failure_threshold=2, reset_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_retries_transient_errors_then_succeeds():
+    breaker = CircuitBreaker("dep", failure_threshold=5)
+    attempts = []
+
+    def flaky(timeout):
+        attempts.append(timeout)
+        if len(attempts) < 3:
+            raise Transient()
+        return "ok"
+
+    result = call_with_retries(flaky, breaker, Deadline(5), 1.0, retry_on=(Transient,),
+                               base_backoff=0.01)
+    assert result == "ok"
+    assert len(attempts) == 3
+    assert breaker.state == "closed"
+
+
+def test_non_retryable_errors_propagate_without_tripping_the_breaker():
+    breaker = CircuitBreaker("dep", failure_threshold=1)
+
+    def bad_request(timeout):
+        raise ValueError("invalid input")
+
+    with pytest.raises(ValueError):
+        call_with_retries(bad_request, breaker, Deadline(5), 1.0, retry_on=(Transient,))
+    assert breaker.state == "closed"
+
+
+def test_gives_up_when_the_breaker_is_open():
+    breaker = CircuitBreaker("dep", failure_threshold=1, reset_timeout=60)
+    open_breaker(breaker)
+    with pytest.raises(DependencyUnavailable):
+        call_with_retries(lambda timeout: "ok", breaker, Deadline(5), 1.0)
+
+
+def test_timeout_is_capped_by_the_deadline():
+    breaker = CircuitBreaker("dep")
+    timeouts = []
+    call_with_retries(lambda timeout: timeouts.append(timeout), breaker, Deadline(0.8), 5.0)
+    assert 0.5 <= timeouts[0] <= 0.8
+
+    with pytest.raises(DependencyUnavailable):
+        call_with_retries(lambda timeout: "ok", breaker, Deadline(0.1), 5.0)
@@ -0,0 +1,85 @@
+"""
+Tests for single-flight request coalescing
+Run with: python -m pytest test_single_flight.py
+"""
+
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def run_concurrently(flight, key, fn, callers):
+    """Start `callers` threads on the same key while the leader is blocked"""
+    outcomes = [None] * callers
+    started = threading.Barrier(callers)
+
+    def caller(i):
+        started.wait()
+        try:
+            outcomes[i] = flight.run(key, fn)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def test_followers_receive_the_leaders_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    threads, outcomes = run_concurrently(flight, "q", compute, 5)
+    while flight.stats()["coalesced"] < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert [result for result, _ in outcomes] == ["answer"] * 5
+    assert sorted(shared for _, shared in outcomes) == [False] + [True] * 4
+    assert flight.stats() == {"executed": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_followers_receive_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def compute():
+        release.wait(5)
+        raise ValueError("backend down")
+
+    threads, outcomes = run_concurrently(flight, "q", compute, 3)
+    while flight.stats()["coalesced"] < 2:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_key_is_released_after_an_error():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.run("q", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert flight.run("q", lambda: 42) == (42, False)
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight()
+    assert flight.run("a", lambda: 1) == (1, False)
+    assert flight.run("b", lambda: 2) == (2, False)
+    assert flight.stats()["executed"] == 2